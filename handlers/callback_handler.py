@@ -14,7 +14,7 @@ from config import Config
 from utils.database import Database
 from utils.user_manager import UserManager
 from utils.logging_utils import log_user_action
-from handlers.message_handler import MessageHandler
+from handlers.message_handler import MessageHandler, NEW_SEARCH_ROW
 from utils.synonyms import SynonymManager
 
 logger = logging.getLogger(__name__)
@@ -22,10 +22,12 @@ logger = logging.getLogger(__name__)
 class CallbackHandler:
     """Класс для обработки callback-запросов."""
     
-    def __init__(self, database: Database, user_manager: UserManager, synonym_manager: SynonymManager):
+    def __init__(self, database: Database, user_manager: UserManager, synonym_manager: SynonymManager,
+                 message_handler: MessageHandler):
         self.db = database
         self.user_manager = user_manager
         self.synonym_manager = synonym_manager
+        self.message_handler = message_handler
 
     async def handle_callback_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         query = update.callback_query
@@ -41,15 +43,11 @@ class CallbackHandler:
                 parts = data.split("_")
                 page = int(parts[2])
                 brand_query = "_".join(parts[3:])
-                handler = MessageHandler(self.db, self.user_manager, self.synonym_manager)
-                matches = self.db.cars_df[self.db.cars_df['brand'].str.lower() == brand_query.lower()]
-                if matches.empty:
-                    matches = self.db.cars_df[self.db.cars_df['brand'].str.lower().str.contains(brand_query.lower())]
-                matches = matches.sort_values(by=["model", "years"], ascending=[True, True])
-                await handler.show_models_with_pagination(update, context, matches, brand_query, page, edit=True)
+                cursor = self.message_handler.get_brand_cursor(brand_query)
+                await self.message_handler.show_models_with_pagination(update, context, cursor, brand_query, page, edit=True)
                 return
             # --- Патч brand_search_fixes: расширенная обработка single_ ---
-            if data.startswith("model_"):
+            if data.startswith("model_") or data.startswith("car_"):
                 await self._handle_model_selection(query, context)
             elif data.startswith("frame_"):
                 await self._handle_frame_selection(query, context)
@@ -76,7 +74,7 @@ class CallbackHandler:
             elif data.startswith("page_"):
                 await self._handle_pagination(query, context)
         except Exception as e:
-            logger.error(f"Ошибка при обработке кнопки: {str(e)}")
+            logger.error("Ошибка при обработке кнопки: %s", e)
             log_user_action(user.id, user.username, "BUTTON_ERROR", getattr(query, "data", ""), str(e))
             try:
                 await query.edit_message_text(
@@ -104,7 +102,7 @@ class CallbackHandler:
         if pass_size:
             buttons.append([InlineKeyboardButton(f"⬅️ Левая ({pass_size} мм)", callback_data=f"single_right_{type_id}")])
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"type_{type_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
         car_rows = self.db.cars_df[
             (self.db.cars_df['brand'] == store.get('brand', '')) &
             (self.db.cars_df['model'] == store.get('model', '')) &
@@ -184,7 +182,7 @@ class CallbackHandler:
         if wb_url and isinstance(wb_url, str) and wb_url.startswith("http"):
             buttons.append([InlineKeyboardButton("🟣 Купить на Wildberries", url=wb_url)])
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"single_{type_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
         await query.message.edit_text(
             message,
             reply_markup=InlineKeyboardMarkup(buttons),
@@ -202,8 +200,12 @@ class CallbackHandler:
             query: Объект callback-запроса
             context: Контекст обработчика
         """
-        model_id = query.data.replace("model_", "")
-        store = self.user_manager.get_callback_data(model_id)
+        if query.data.startswith("car_"):
+            # car_<поколение каталога>_<позиция>; кнопки старого формата или каталога не находятся
+            generation, _, position = query.data[len("car_"):].partition("_")
+            store = self.db.get_car_key(generation, int(position)) if position.isdigit() else None
+        else:
+            store = self.user_manager.get_callback_data(query.data.replace("model_", ""))
         
         if not store:
             await query.message.edit_text(
@@ -227,44 +229,30 @@ class CallbackHandler:
         car_info = self.db.get_car_info(car)
         
         mount = car['mount']
-        driver_size = int(car['driver']) if str(car['driver']).isdigit() else None
-        pass_size = int(car['passanger']) if str(car['passanger']).isdigit() else None
+        driver_size, pass_size = self.db.get_wiper_sizes(car)
         
         # Получение доступных типов корпусов
-        available_frames = self.db.get_available_frames(mount, [driver_size, pass_size])
+        frames = self.db.get_available_frame_names(mount, [driver_size, pass_size])
         
-        if available_frames.empty:
+        if not frames:
             await query.message.edit_text(
                 car_info + "\n⚠️ К сожалению, для этого автомобиля нет подходящих щёток в нашем каталоге.",
                 parse_mode='HTML'
             )
             return
         
-        # Создание кнопок для выбора типа корпуса
-        buttons = []
-        for _, rowf in available_frames.iterrows():
-            frame = rowf['gy_frame']
-            frame_id = self.user_manager.store_callback_data({
-                "brand": car['brand'],
-                "model": car['model'],
-                "years": car['years'],
-                "mount": mount,
-                "driver_size": driver_size,
-                "pass_size": pass_size,
-                "gy_frame": frame
-            })
-            btn = InlineKeyboardButton(str(frame), callback_data=f"frame_{frame_id}")
-            buttons.append([btn])
-        
-      
-        
-        
-        # Добавление кнопки для нового поиска
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        reply_markup = self.message_handler.build_frames_markup({
+            "brand": car['brand'],
+            "model": car['model'],
+            "years": car['years'],
+            "mount": mount,
+            "driver_size": driver_size,
+            "pass_size": pass_size,
+        }, frames)
         
         await query.message.edit_text(
             car_info + "\n<b>Выберите тип:</b>",
-            reply_markup=InlineKeyboardMarkup(buttons),
+            reply_markup=reply_markup,
             parse_mode='HTML'
         )
     
@@ -309,16 +297,19 @@ class CallbackHandler:
             return
         
         # Создание кнопок для выбора вида щетки
-        buttons = []
-        for _, rowt in available_types.iterrows():
-            gy_type = rowt['gy_type']
-            type_id = self.user_manager.store_callback_data({**store, "gy_type": gy_type})
-            buttons.append([InlineKeyboardButton(str(gy_type), callback_data=f"type_{type_id}")])
+        gy_types = available_types['gy_type'].to_numpy()
+        # Виды щеток и кнопка "Назад" сохраняются одним вызовом
+        *type_ids, back_to_frames_id = self.user_manager.store_callback_data_batch(
+            [{**store, "gy_type": gy_type} for gy_type in gy_types] + [{**store}]
+        )
+        buttons = [
+            [InlineKeyboardButton(str(gy_type), callback_data=f"type_{type_id}")]
+            for gy_type, type_id in zip(gy_types, type_ids)
+        ]
 
         # Кнопки "Назад" и "Новый поиск"
-        back_to_frames_id = self.user_manager.store_callback_data({**store})
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"back_to_frames_{back_to_frames_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
 
         # Получение информации об автомобиле
         car_rows = self.db.cars_df[
@@ -416,7 +407,7 @@ class CallbackHandler:
             "gy_frame": frame
         })
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"back_to_frames_{back_to_frames_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
 
         # Получение информации об автомобиле
         car_rows = self.db.cars_df[
@@ -539,7 +530,7 @@ class CallbackHandler:
             buttons.append([InlineKeyboardButton("🟣 Комплект на Wildberries", url=wb_kit_url)])
         
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"type_{type_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
 
         await query.message.edit_text(
             message,
@@ -595,40 +586,29 @@ class CallbackHandler:
         
         car = car_rows.iloc[0]
         mount = car['mount']
-        driver_size = int(car['driver']) if str(car['driver']).isdigit() else None
-        pass_size = int(car['passanger']) if str(car['passanger']).isdigit() else None
+        driver_size, pass_size = self.db.get_wiper_sizes(car)
         car_info = self.db.get_car_info(car)
         
         # Получение доступных типов корпусов
-        available_frames = self.db.get_available_frames(mount, [driver_size, pass_size])
+        frames = self.db.get_available_frame_names(mount, [driver_size, pass_size])
         
-        if available_frames.empty:
+        if not frames:
             await query.message.edit_text(
                 car_info + "\n⚠️ К сожалению, для этого автомобиля нет подходящих щёток в нашем каталоге.",
                 parse_mode='HTML'
             )
             return
         
-        # Создание кнопок для выбора типа корпуса
-        buttons = []
-        for _, rowf in available_frames.iterrows():
-            frame = rowf['gy_frame']
-            frame_id = self.user_manager.store_callback_data({
-                **store,
-                "mount": mount,
-                "driver_size": driver_size,
-                "pass_size": pass_size,
-                "gy_frame": frame
-            })
-            btn = InlineKeyboardButton(str(frame), callback_data=f"frame_{frame_id}")
-            buttons.append([btn])
-        
-        # Добавление кнопки для нового поиска
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        reply_markup = self.message_handler.build_frames_markup({
+            **store,
+            "mount": mount,
+            "driver_size": driver_size,
+            "pass_size": pass_size,
+        }, frames)
         
         await query.message.edit_text(
             car_info + "\n<b>Выберите тип:</b>",
-            reply_markup=InlineKeyboardMarkup(buttons),
+            reply_markup=reply_markup,
             parse_mode='HTML'
         )
     
@@ -664,18 +644,19 @@ class CallbackHandler:
             return
         
         # Создание кнопок для выбора вида щетки
-        buttons = []
-        for _, rowt in available_types.iterrows():
-            gy_type = rowt['gy_type']
-            type_id = self.user_manager.store_callback_data({
-                **store, "gy_type": gy_type
-            })
-            buttons.append([InlineKeyboardButton(str(gy_type), callback_data=f"type_{type_id}")])
+        gy_types = available_types['gy_type'].to_numpy()
+        # Виды щеток и кнопка "Назад" сохраняются одним вызовом
+        *type_ids, back_to_frames_id = self.user_manager.store_callback_data_batch(
+            [{**store, "gy_type": gy_type} for gy_type in gy_types] + [{**store}]
+        )
+        buttons = [
+            [InlineKeyboardButton(str(gy_type), callback_data=f"type_{type_id}")]
+            for gy_type, type_id in zip(gy_types, type_ids)
+        ]
         
         # Добавление кнопки "Назад"
-        back_to_frames_id = self.user_manager.store_callback_data({**store})
         buttons.append([InlineKeyboardButton("🔙 Назад", callback_data=f"back_to_frames_{back_to_frames_id}")])
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
 
         # Получение информации об автомобиле
         car_rows = self.db.cars_df[
@@ -1,33 +1,152 @@
 """
 Модуль для обработки команд бота.
 """
+import asyncio
 import logging
 import os
 from typing import Dict, Any, Optional
 
-from telegram import Update
+from telegram import InputFile, Update
 from telegram.ext import ContextTypes
 
 from config import Config
 from utils.user_manager import UserManager
-from utils.logging_utils import log_user_action
+from utils.logging_utils import log_user_action, get_current_utc
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from handlers.message_handler import MessageHandler, NEW_SEARCH_ROW, NO_LINK_PREVIEW
 
 MODELS_PER_PAGE = 100  # Можно вынести в Config
+# Имя файла приветственного видео в WIPER_TYPES_IMG_DIR
+WELCOME_VIDEO_FILENAME = "gy_video.mp4"
 
 logger = logging.getLogger(__name__)
 
+# Статические тексты команд (собираются один раз при импорте модуля)
+_START_TEXT_HTML = (
+    "👋 <b>Привет!</b>\n\nЯ помогу подобрать подходящие щётки стеклоочистителя для вашего автомобиля.\n\n"
+    "Напишите марку и следуйте моим инструкциям, например:\n"
+    "• Lada • KIA • Renault •\n\n"
+    "/help - Справка по использованию\n"
+)
+
+_HELP_TEXT_HTML = (
+    "<b>Справка по использованию бота</b>\n\n"
+    "Этот бот поможет подобрать щётки Goodyear для вашего автомобиля.\n\n"
+    "<b>Как пользоваться:</b>\n"
+    "1. Напишите марку\n"
+    "2. Выберите точную модель из списка\n"
+    "3. Выберите тип и вид щётки\n"
+    "4. Выберите маркетплейс для покупки\n\n"
+    "<b>Доступные команды:</b>\n"
+    "/start - Начать работу с ботом\n"
+    "/help - Показать эту справку\n"
+    "/brand - Поиск по марке автомобиля\n"
+    "/feedback - Отправить отзыв о работе бота\n\n"
+    "<b>Советы:</b>\n"
+    "• Вы можете указать год выпуска автомобиля для более точного поиска\n"
+    "• Используйте команду /brand для поиска всех моделей определенной марки\n"
+    "• Оставить отзыв можно использовав команду /feedback"
+)
+
+_FEEDBACK_PROMPT_HTML = (
+    "📝 <b>Отправка отзыва</b>\n\n"
+    "Пожалуйста, напишите ваш отзыв о работе бота. Ваше мнение поможет нам улучшить сервис.\n\n"
+    "Отправьте сообщение с вашим отзывом или нажмите ➡︎ /cancel для отмены."
+)
+
+_BRAND_PROMPT_HTML = (
+    "🚗 <b>Поиск по марке автомобиля</b>\n\n"
+    "Пожалуйста, введите марку автомобиля для поиска.\n"
+    "Например: <code>BMW</code> или <code>Toyota</code>"
+)
+
 class CommandHandler:
     """Класс для обработки команд бота."""
     
-    def __init__(self, user_manager: UserManager):
+    def __init__(self, user_manager: UserManager, message_handler: MessageHandler):
         """
         Инициализация обработчика команд.
         
         Args:
             user_manager: Менеджер пользователей
+            message_handler: Общий обработчик сообщений (для поиска по марке)
         """
         self.user_manager = user_manager
+        self.message_handler = message_handler
+        self._feedback_dir = os.path.join(Config.LOGS_DIR, 'feedback')
+        os.makedirs(self._feedback_dir, exist_ok=True)
+        self._video_file_id_path = os.path.join(Config.LOGS_DIR, ".video_file_id")
+        self._video_file_id: Optional[str] = self._load_video_file_id()
+        # Байты видео нужны только до первой успешной загрузки в Telegram
+        self._video_bytes = self._load_video() if self._video_file_id is None else None
+    
+    @staticmethod
+    def _load_video() -> Optional[bytes]:
+        """
+        Загружает приветственное видео в память.
+        
+        Returns:
+            Optional[bytes]: Содержимое видео или None, если файл отсутствует
+        """
+        video_path = os.path.join(Config.WIPER_TYPES_IMG_DIR, WELCOME_VIDEO_FILENAME)
+        if not os.path.exists(video_path):
+            return None
+        try:
+            with open(video_path, "rb") as video:
+                return video.read()
+        except OSError as e:
+            logger.error("Не удалось прочитать приветственное видео: %s", e)
+            return None
+    
+    def _load_video_file_id(self) -> Optional[str]:
+        """
+        Загружает сохраненный file_id приветственного видео.
+        
+        Returns:
+            Optional[str]: file_id или None, если видео еще не загружалось
+        """
+        try:
+            with open(self._video_file_id_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+    
+    def _save_video_file_id(self, file_id: str) -> None:
+        """
+        Сохраняет file_id приветственного видео для повторного использования.
+        
+        Args:
+            file_id: Идентификатор файла на серверах Telegram
+        """
+        self._video_file_id = file_id
+        self._video_bytes = None
+        try:
+            os.makedirs(Config.LOGS_DIR, exist_ok=True)
+            with open(self._video_file_id_path, "w", encoding="utf-8") as f:
+                f.write(file_id)
+        except OSError as e:
+            logger.error("Не удалось сохранить file_id видео: %s", e)
+    
+    def _reset_video_file_id(self) -> None:
+        """Забывает file_id, отклоненный Telegram, чтобы при следующем /start видео загрузилось заново."""
+        self._video_file_id = None
+        try:
+            os.remove(self._video_file_id_path)
+        except OSError:
+            pass
+        self._video_bytes = self._load_video()
+    
+    @staticmethod
+    def _append_feedback(feedback_file: str, line: str) -> None:
+        """
+        Дописывает строку отзыва в файл (выполняется в отдельном потоке).
+        
+        Args:
+            feedback_file: Путь к файлу отзывов
+            line: Строка для записи
+        """
+        with open(feedback_file, 'a', encoding='utf-8') as f:
+            f.write(line)
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -41,51 +160,35 @@ class CommandHandler:
         self.user_manager.register_user(user.id)
         log_user_action(user.id, user.username, "START")
         
+        sent_by_file_id = self._video_file_id is not None
         try:
-            # Проверка наличия видео
-            video_path = os.path.join(Config.WIPER_TYPES_IMG_DIR, "gy_video.mp4")
-            if os.path.exists(video_path):
-                with open(video_path, "rb") as video:
-                    await update.message.reply_video(
-                        video=video,
-                        caption="👋 <b>Привет!</b>\n\nЯ помогу подобрать подходящие щётки стеклоочистителя для вашего автомобиля.\n\n"
-                                "Напишите марку и следуйте моим инструкциям, например:\n"
-                                "• Lada • KIA • Renault •\n\n"                                
-
-                                "/help - Справка по использованию\n"
-                                ,
-                        parse_mode='HTML'
-                    )
-            else:
-                await update.message.reply_text(
-                    f"👋 <b>Привет!</b>\n\nЯ помогу подобрать подходящие щётки стеклоочистителя для вашего автомобиля.\n\n"
-                                "Напишите марку и следуйте инструкциям, например:\n"
-                                "• Lada • KIA • Renault •\n\n"                                
-
-                                "/help - Справка по использованию\n"
-                                        ,
+            if sent_by_file_id:
+                # Видео уже загружено в Telegram — отправляем по file_id без повторной загрузки
+                await update.message.reply_video(
+                    video=self._video_file_id,
+                    caption=_START_TEXT_HTML,
+                    parse_mode='HTML'
+                )
+            elif self._video_bytes is not None:
+                # Имя файла передается явно: по нему Telegram определяет тип, как при отправке файла
+                sent = await update.message.reply_video(
+                    video=InputFile(self._video_bytes, filename=WELCOME_VIDEO_FILENAME),
+                    caption=_START_TEXT_HTML,
                     parse_mode='HTML'
                 )
+                if sent.video is not None:
+                    self._save_video_file_id(sent.video.file_id)
+            else:
+                await update.message.reply_text(_START_TEXT_HTML, parse_mode='HTML')
         except Exception as e:
-            logger.error(f"Не удалось отправить приветственное сообщение: {e}")
-            await update.message.reply_text(
-                "👋 <b>Привет!</b>\n\nЯ помогу подобрать подходящие щётки стеклоочистителя для вашего автомобиля.\n\n"
-                                "Напишите марку и следуйте моим инструкциям, например:\n"
-                                "• Lada • KIA • Renault •\n\n"                                
-
-                                "/help - Справка по использованию\n",
-                parse_mode='HTML'
-            )
+            logger.error("Не удалось отправить приветственное сообщение: %s", e)
+            if sent_by_file_id:
+                self._reset_video_file_id()
+            await update.message.reply_text(_START_TEXT_HTML, parse_mode='HTML')
             
     async def show_models_with_pagination(self, update, context, brand: str, page: int = 0):
-        models = self.user_manager.get_models_for_brand(brand)
-        # 1. Приводим к строке и убираем пробелы
-        models = [str(m).strip() for m in models]
-        # 2. Сортируем по всей строке
-        models = sorted(models, key=lambda m: m.upper())
-
-        # Для отладки, выведи в консоль — увидишь, если есть лишние пробелы или не строки
-        print("MODELS:", models)
+        # Отсортированный список кэшируется в UserManager, здесь только срез страницы
+        models = self.user_manager.get_sorted_models(brand)
 
         total = len(models)
         start = page * MODELS_PER_PAGE
@@ -93,13 +196,19 @@ class CommandHandler:
         current_models = models[start:end]
 
         if not current_models:
-            await update.message.reply_text(f"Не найдено моделей для марки {brand.title()}.")
+            await update.message.reply_text(
+                f"Не найдено моделей для марки {brand.title()}.",
+                link_preview_options=NO_LINK_PREVIEW
+            )
             return
 
-        buttons = []
-        for model in current_models:
-            model_id = self.user_manager.store_callback_data({"brand": brand, "model": model})
-            buttons.append([InlineKeyboardButton(model, callback_data=f"model_{model_id}")])
+        model_ids = self.user_manager.store_callback_data_batch(
+            [{"brand": brand, "model": model} for model in current_models]
+        )
+        buttons = [
+            [InlineKeyboardButton(model, callback_data=f"model_{model_id}")]
+            for model, model_id in zip(current_models, model_ids)
+        ]
 
         nav_buttons = []
         if page > 0:
@@ -109,13 +218,14 @@ class CommandHandler:
         if nav_buttons:
             buttons.append(nav_buttons)
         # Кнопка "Новый поиск" всегда последней строкой!
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
 
  
         await update.message.reply_text(
             f"<b>Выберите модель для {brand.title()}:</b>\nПоказано {start+1}-{min(end, total)} из {total}",
             reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode='HTML'
+            parse_mode='HTML',
+            link_preview_options=NO_LINK_PREVIEW
         )
         
     async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -129,27 +239,7 @@ class CommandHandler:
         user = update.effective_user
         log_user_action(user.id, user.username, "HELP")
         
-        await update.message.reply_text(
-            "<b>Справка по использованию бота</b>\n\n"
-            "Этот бот поможет подобрать щётки Goodyear для вашего автомобиля.\n\n"
-            "<b>Как пользоваться:</b>\n"
-            "1. Напишите марку\n"
-            "2. Выберите точную модель из списка\n"
-            "3. Выберите тип и вид щётки\n"
-            "4. Выберите маркетплейс для покупки\n\n"
-
-            "<b>Доступные команды:</b>\n"
-            "/start - Начать работу с ботом\n"
-            "/help - Показать эту справку\n"
-            "/brand - Поиск по марке автомобиля\n"
-            "/feedback - Отправить отзыв о работе бота\n\n"
-            "<b>Советы:</b>\n"
-            "• Вы можете указать год выпуска автомобиля для более точного поиска\n"
-            
-            "• Используйте команду /brand для поиска всех моделей определенной марки\n"
-            "• Оставить отзыв можно использовав команду /feedback",
-            parse_mode='HTML'
-        )
+        await update.message.reply_text(_HELP_TEXT_HTML, parse_mode='HTML')
     async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
         Обрабатывает команду /stats.
@@ -165,8 +255,8 @@ class CommandHandler:
         
         await update.message.reply_text(
             f"<b>Статистика использования бота</b>\n\n"
-            f"👥 Всего обращений к боту: {stats['all_users_count']}\n"
-            f"🧑‍💻 Уникальных пользователей: {stats['unique_users']}",
+            f"👥 Всего обращений к боту: {stats.all_users_count}\n"
+            f"🧑‍💻 Уникальных пользователей: {stats.unique_users}",
             parse_mode='HTML'
         )
     
@@ -186,12 +276,7 @@ class CommandHandler:
         # Сохраняем в контексте, что пользователь отправляет отзыв
         context.user_data['waiting_for_feedback'] = True
         
-        await update.message.reply_text(
-            "📝 <b>Отправка отзыва</b>\n\n"
-            "Пожалуйста, напишите ваш отзыв о работе бота. Ваше мнение поможет нам улучшить сервис.\n\n"
-            "Отправьте сообщение с вашим отзывом или нажмите ➡︎ /cancel для отмены.",
-            parse_mode='HTML'
-        )
+        await update.message.reply_text(_FEEDBACK_PROMPT_HTML, parse_mode='HTML')
     
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -224,12 +309,7 @@ class CommandHandler:
             brand_query = ' '.join(context.args)
             await self._handle_brand_search(update, context, brand_query)
         else:
-            await update.message.reply_text(
-                "🚗 <b>Поиск по марке автомобиля</b>\n\n"
-                "Пожалуйста, введите марку автомобиля для поиска.\n"
-                "Например: <code>BMW</code> или <code>Toyota</code>",
-                parse_mode='HTML'
-            )
+            await update.message.reply_text(_BRAND_PROMPT_HTML, parse_mode='HTML')
             context.user_data['waiting_for_brand'] = True
 
     async def _handle_brand_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE, brand_query: str) -> None:
@@ -241,11 +321,7 @@ class CommandHandler:
             context: Контекст обработчика
             brand_query: Запрос марки автомобиля
         """
-        from handlers.message_handler import MessageHandler
-        
-        # Создаем временный объект MessageHandler для использования его методов
-        message_handler = MessageHandler(self.database, self.user_manager, self.synonym_manager)
-        await message_handler.show_models_with_pagination(update, context, brand_query, page=0)
+        await self.message_handler.handle_brand_search(update, context, brand_query)
     
     async def handle_feedback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """
@@ -272,18 +348,17 @@ class CommandHandler:
         
         # Сохранение отзыва в файл
         try:
-            os.makedirs(os.path.join(Config.LOGS_DIR, 'feedback'), exist_ok=True)
-            feedback_file = os.path.join(Config.LOGS_DIR, 'feedback', f'feedback_{user.id}.txt')
+            feedback_file = os.path.join(self._feedback_dir, f'feedback_{user.id}.txt')
+            line = f"[{get_current_utc()}] {user.id} ({user.username}): {feedback_text}\n"
             
-            with open(feedback_file, 'a', encoding='utf-8') as f:
-                from utils.logging_utils import get_current_utc
-                f.write(f"[{get_current_utc()}] {user.id} ({user.username}): {feedback_text}\n")
+            # Запись на диск не должна блокировать цикл событий
+            await asyncio.to_thread(self._append_feedback, feedback_file, line)
             
             await update.message.reply_text(
                 "✅ Спасибо за ваш отзыв! Мы обязательно учтем его при улучшении бота. /start"
             )
         except Exception as e:
-            logger.error(f"Ошибка при сохранении отзыва: {e}")
+            logger.error("Ошибка при сохранении отзыва: %s", e)
             await update.message.reply_text(
                 "⚠️ Произошла ошибка при сохранении отзыва. Пожалуйста, попробуйте позже. /start"
             )
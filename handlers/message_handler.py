@@ -2,25 +2,38 @@
 Модуль для обработки команд и сообщений пользователя.
 """
 import os
+import re
+import asyncio
 import logging
+import numpy as np
 import pandas as pd
 
 from typing import List, Dict, Any, Optional, Tuple, Union
 
 from telegram import (
-    Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, LinkPreviewOptions
 )
 from telegram.ext import ContextTypes
 
 from config import Config
 from utils.database import Database
 from utils.search import CarSearchEngine
+from utils.cache import SearchCache
 from utils.user_manager import UserManager
 from utils.synonyms import SynonymManager
 from utils.logging_utils import log_user_action
+from utils.text_utils import normalize_key
 
 logger = logging.getLogger(__name__)
 MODELS_PER_PAGE = 50
+BRAND_CURSOR_TTL = 120  # Время жизни отсортированной выдачи по марке, в секундах
+PAGE_MARKUP_TTL = 60  # Время жизни готовой клавиатуры страницы, в секундах
+_DIGIT_RE = re.compile(r'\d')
+# Ответы бота не содержат ссылок, для которых нужен предпросмотр
+NO_LINK_PREVIEW = LinkPreviewOptions(is_disabled=True)
+# Кнопка и строка неизменяемые, поэтому один экземпляр переиспользуется во всех клавиатурах
+NEW_SEARCH_BUTTON = InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")
+NEW_SEARCH_ROW = (NEW_SEARCH_BUTTON,)
 
 class MessageHandler:
     """Класс для обработки сообщений пользователя."""
@@ -37,31 +50,121 @@ class MessageHandler:
         self.db = database
         self.user_manager = user_manager
         self.synonym_manager = synonym_manager
-        self.search_engine = CarSearchEngine(database.cars_df)
+        self.search_engine = CarSearchEngine(database.cars_unique_df)
+        # Марка -> отсортированные позиции строк cars_unique_df, чтобы листание страниц не пересчитывало выдачу
+        self._brand_cursor = SearchCache(expiry_time=BRAND_CURSOR_TTL)
+        # "страница:марка" -> готовая клавиатура; не зависит от пользователя, поэтому общая для всех
+        self._page_markup_cache = SearchCache(expiry_time=PAGE_MARKUP_TTL)
 
-    async def show_models_with_pagination(self, update, context, matches, brand_query, page=0, edit=False):
-        matches = matches.sort_values(by=["model", "years"], ascending=[True, True])
-        total = len(matches)
+    def _build_cursor(self, matches: pd.DataFrame, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Строит курсор выдачи: позиции строк cars_unique_df, отсортированные по модели и годам.
+        
+        cars_unique_df уже отсортирован по модели и годам, поэтому достаточно упорядочить позиции.
+        При заданном limit сортируются только первые limit позиций (после np.partition).
+        
+        Args:
+            matches: DataFrame с найденными моделями (подмножество cars_unique_df)
+            limit: Максимальное количество позиций в курсоре
+            
+        Returns:
+            np.ndarray: Позиции строк в cars_unique_df
+        """
+        positions = self.db.cars_unique_df.index.get_indexer(matches.index)
+        if limit is not None and len(positions) > limit:
+            positions = np.partition(positions, limit - 1)[:limit]
+        return np.sort(positions)
+
+    def get_brand_cursor(self, brand_query: str) -> np.ndarray:
+        """
+        Возвращает курсор выдачи по марке из кэша, пересчитывая его при промахе.
+        
+        Args:
+            brand_query: Марка (каноническое название из callback_data)
+            
+        Returns:
+            np.ndarray: Позиции строк в cars_unique_df, отсортированные по модели и годам
+        """
+        key = normalize_key(brand_query)
+        cursor = self._brand_cursor.get(key)
+        if cursor is None:
+            matches, _ = self._find_brand_matches(brand_query)
+            cursor = self._build_cursor(matches)
+            self._brand_cursor.set(key, cursor)
+        return cursor
+
+    def _find_brand_matches(self, brand_query: str) -> Tuple[pd.DataFrame, str]:
+        """
+        Ищет автомобили по марке с учетом синонимов.
+        
+        Сначала ищется точная марка, чтобы настоящая марка, совпадающая с ключом синонима,
+        не перенаправлялась. Затем синоним (включая транслитерированный)
+        разрешается одним обращением к словарю, после него — подстрока марки и, в последнюю
+        очередь, точная модель.
+        
+        Args:
+            brand_query: Запрос пользователя или каноническое название из callback_data
+            
+        Returns:
+            Tuple[pd.DataFrame, str]: Найденные строки cars_unique_df и канонический ключ
+        """
+        key = normalize_key(brand_query)
+        canon = key
+        matches = self.db.get_cars_by_brand(key)
+        if matches.empty:
+            synonym = self.synonym_manager.get_canonical(key)
+            if synonym is not None and synonym != key:
+                canon = synonym
+                matches = self.db.get_cars_by_brand(canon)
+        if matches.empty:
+            matches = self.db.get_cars_by_brand_substring(key)
+        if matches.empty:
+            matches = self.db.get_cars_by_model(self.db.normalize_text(canon))
+        return matches, canon
+
+    def _get_models_page_markup(self, cursor: np.ndarray, brand_query: str, page: int) -> InlineKeyboardMarkup:
+        """
+        Возвращает клавиатуру страницы выдачи по марке, переиспользуя уже построенную.
+        
+        Кнопки моделей ссылаются на позицию строки в cars_unique_df (car_<поколение>_<позиция>),
+        поэтому клавиатура одинакова для всех пользователей и не требует callback_storage.
+        Поколение каталога входит в ключ кэша, чтобы после перезагрузки каталога не отдавались
+        клавиатуры со старыми позициями.
+        
+        Args:
+            cursor: Позиции строк cars_unique_df, отсортированные по модели и годам
+            brand_query: Марка для кнопок навигации
+            page: Номер страницы
+            
+        Returns:
+            InlineKeyboardMarkup: Клавиатура страницы
+        """
+        key = f"{self.db.cars_generation}:{page}:{brand_query}"
+        markup = self._page_markup_cache.get(key)
+        if markup is not None:
+            return markup
+        
         start = page * MODELS_PER_PAGE
         end = start + MODELS_PER_PAGE
-        current_matches = matches.iloc[start:end]
-        buttons = []
-        for _, row in current_matches.iterrows():
-            callback_id = self.user_manager.store_callback_data({
-                "brand": row['brand'],
-                "model": row['model'],
-                "years": row['years'],
-            })
-            button_text = f"{row['model'].upper()} ({row['years']})"
-            buttons.append([InlineKeyboardButton(button_text, callback_data=f"model_{callback_id}")])
+        buttons = [[button] for button in self._model_buttons(cursor[start:end])]
         nav_buttons = []
         if page > 0:
             nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"models_page_{page-1}_{brand_query}"))
-        if end < total:
+        if end < len(cursor):
             nav_buttons.append(InlineKeyboardButton("➡️ Далее", callback_data=f"models_page_{page+1}_{brand_query}"))
         if nav_buttons:
             buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
+        
+        markup = InlineKeyboardMarkup(buttons)
+        self._page_markup_cache.set(key, markup)
+        return markup
+
+    async def show_models_with_pagination(self, update, context, cursor, brand_query, page=0, edit=False):
+        total = len(cursor)
+        start = page * MODELS_PER_PAGE
+        end = start + MODELS_PER_PAGE
+        reply_markup = self._get_models_page_markup(cursor, brand_query, page)
         msg_text = (
             f"🔍 По марке <b>\"{brand_query}\"</b> найдено {total} моделей:\n\n"
             f"Показано {start+1}-{min(end, total)} из {total}\n"
@@ -70,14 +173,16 @@ class MessageHandler:
         if edit:
             await update.callback_query.edit_message_text(
                 msg_text,
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='HTML'
+                reply_markup=reply_markup,
+                parse_mode='HTML',
+                link_preview_options=NO_LINK_PREVIEW
             )
         else:
             await update.message.reply_text(
                 msg_text,
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='HTML'
+                reply_markup=reply_markup,
+                parse_mode='HTML',
+                link_preview_options=NO_LINK_PREVIEW
             )
 
     async def handle_brand_search(self, update, context, brand_query):
@@ -85,35 +190,23 @@ class MessageHandler:
         self.user_manager.register_user(user.id)
         log_user_action(user.id, user.username, "BRAND_SEARCH", brand_query)
         await update.message.chat.send_action("typing")
-        brand_query_norm = brand_query.strip().lower()
-
-        # 1. Точное совпадение
-        matches = self.db.cars_df[self.db.cars_df['brand'].str.lower() == brand_query_norm]
-        canonical_for_pagination = brand_query  # по умолчанию
-
-        # 2. Частичное совпадение
-        if matches.empty:
-            matches = self.db.cars_df[self.db.cars_df['brand'].str.lower().str.contains(brand_query_norm)]
-        # 3. Поиск по синонимам
-        if matches.empty:
-            synonyms = self.synonym_manager.get_synonyms()
-            for canon, syns in synonyms.items():
-                all_syns = [canon] + (syns if isinstance(syns, list) else [syns])
-                if brand_query_norm in [s.lower() for s in all_syns]:
-                    matches = self.db.cars_df[self.db.cars_df['brand'].str.lower() == canon.lower()]
-                    canonical_for_pagination = canon
-                    break
+        matches, canon = self._find_brand_matches(brand_query)
+        # Для кнопок листания оставляем запрос как есть, если он сам является каноническим
+        canonical_for_pagination = brand_query if canon == normalize_key(brand_query) else canon
 
-        # 4. Если ничего не найдено — ошибка
+        # Если ничего не найдено — ошибка
         if matches.empty:
             await update.message.reply_text(
                 f"По запросу <b>\"{brand_query}\"</b> не найдено ни одной марки автомобиля.",
-                parse_mode='HTML'
+                parse_mode='HTML',
+                link_preview_options=NO_LINK_PREVIEW
             )
             return
 
-        # 5. Всегда используем show_models_with_pagination!
-        await self.show_models_with_pagination(update, context, matches, canonical_for_pagination, page=0)
+        # Сохраняем курсор для листания и всегда используем show_models_with_pagination!
+        cursor = self._build_cursor(matches)
+        self._brand_cursor.set(normalize_key(canonical_for_pagination), cursor)
+        await self.show_models_with_pagination(update, context, cursor, canonical_for_pagination, page=0)
 
     def _create_model_buttons_multirow(self, matches: pd.DataFrame, buttons_per_row: int = 1) -> List[List[InlineKeyboardButton]]:
         """
@@ -127,56 +220,33 @@ class MessageHandler:
             List[List[InlineKeyboardButton]]: Список кнопок
 
         """
-        matches = matches.sort_values(by=["model", "years"], ascending=[True, True])
-        buttons = []
-        current_row = []
-        seen = set()
-        button_count = 0
-        
-        for _, row in matches.iterrows():
-            key = (row['brand'], row['model'], row['years'])
-            if key not in seen:
-                callback_id = self.user_manager.store_callback_data({
-                    "brand": row['brand'],
-                    "model": row['model'],
-                    "years": row['years'],
-                })
-                callback_data = f"model_{callback_id}"
-                button_text = f"{row['model'].upper()} ({row['years']})"
-                
-                current_row.append(InlineKeyboardButton(button_text, callback_data=callback_data))
-                button_count += 1
-                
-                # Если достигли нужного количества кнопок в строке или это последняя модель
-                if button_count % buttons_per_row == 0:
-                    buttons.append(current_row)
-                    current_row = []
-                
-                seen.add(key)
-                
-                if len(seen) >= Config.MAX_RESULTS:
-                    break
-        
-        # Добавляем оставшиеся кнопки, если есть
-        if current_row:
-            buttons.append(current_row)
-        
-        return buttons
+        model_buttons = self._model_buttons(self._build_cursor(matches, Config.MAX_RESULTS))
+        return [
+            model_buttons[i:i + buttons_per_row]
+            for i in range(0, len(model_buttons), buttons_per_row)
+        ]
     
-    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: Optional[str] = None) -> None:
         '''
         Обрабатывает текстовые сообщения пользователя.
+        
+        Args:
+            update: Объект обновления Telegram
+            context: Контекст обработчика
+            text: Уже очищенный от пробелов текст сообщения (если вызывающий код его вычислил)
         '''
+        if text is None:
+            text = update.message.text.strip()
+        
         # --- Патч brand_search_fixes ---
         if context.user_data.get('waiting_for_brand'):
             del context.user_data['waiting_for_brand']
-            await self.handle_brand_search(update, context, update.message.text)
+            await self.handle_brand_search(update, context, text)
             return
             
         # Оригинальный код обработки сообщения
         user = update.effective_user
         self.user_manager.register_user(user.id)
-        text = update.message.text.strip()
         context.user_data['user_query_message_id'] = update.message.message_id
         
         # Логирование действия пользователя
@@ -185,131 +255,138 @@ class MessageHandler:
         # Отправка индикатора загрузки
         await update.message.chat.send_action("typing")
         
-        # Получение синонимов
-        synonyms = self.synonym_manager.get_synonyms()
-        
-        # Функция для логирования отладочной информации
+        # Функция для логирования отладочной информации (не передается, если INFO отключен)
         def log_debug(msg: str) -> None:
-            logger.info(f"SEARCH_DEBUG | User: {user.id} | Query: {text!r} | {msg}")
+            logger.info("SEARCH_DEBUG | User: %s | Query: %r | %s", user.id, text, msg)
+        
+        if not logger.isEnabledFor(logging.INFO):
+            log_debug = None
         
         # Проверяем, является ли запрос просто маркой автомобиля (без модели)
         # Это эвристика: если запрос короткий (1-2 слова) и не содержит цифр, 
         # то это, вероятно, только марка
-        words = text.split()
-        contains_digits = any(char.isdigit() for char in text)
-        
-        if len(words) <= 2 and not contains_digits:
-            # Проверяем, есть ли точное совпадение по марке
-            brand_matches = self.db.cars_df[self.db.cars_df['brand'].str.lower() == text.lower()]
-            
+        # Сначала дешевая проверка на цифры; split ограничен тремя частями — нужно лишь знать, слов больше двух или нет
+        if _DIGIT_RE.search(text) is None and len(text.split(None, 2)) <= 2:
             # Если есть точное совпадение по марке, обрабатываем как поиск по марке
-            if not brand_matches.empty:
+            # (проверка принадлежности к таблице марок, без выборки строк)
+            if self.user_manager.is_valid_brand(text):
                 await self.handle_brand_search(update, context, text)
                 return
         
-        # Поиск автомобилей по обычному запросу
-        result = self.search_engine.search(text, synonyms, log_debug=log_debug)
+        # Поиск автомобилей по обычному запросу (в отдельном потоке, чтобы не блокировать другие чаты)
+        result = await asyncio.to_thread(
+            self.search_engine.search, text, self.synonym_manager.lookup, log_debug, self.synonym_manager.generation
+        )
         matches = result['matches']
         similar = result['similar']
         
-        # Если нет совпадений, но есть похожие результаты
-        if matches.empty and not similar.empty:
-            buttons = self._create_model_buttons(similar)
-            buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
-            
-            await update.message.reply_text(
-                f"🔍 По запросу <b>\"{text}\"</b> точных совпадений не найдено, но есть похожие модели:\n\n"
-                f"Выберите модель из списка:",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='HTML'
-            )
-            return
-        
         # Если нет совпадений и нет похожих результатов
-        if matches.empty:
+        if matches.empty and similar.empty:
             await update.message.reply_text(
                 f"По запросу <b>\"{text}\"</b> ничего не найдено.\n\n"
                 f"Попробуйте другой запрос, например:\n"
                 f"• Audi • KIA • Lada\n"
                 f"/start",
-                parse_mode='HTML'
+                parse_mode='HTML',
+                link_preview_options=NO_LINK_PREVIEW
             )
             return
         
         # Если найдено только одно совпадение
         if len(matches) == 1:
-            car = matches.iloc[0]
+            # Одна конвертация в dict вместо повторного доступа к полям Series
+            car = matches.iloc[0].to_dict()
             car_info = self.db.get_car_info(car)
             
             mount = car['mount']
-            driver_size = int(car['driver']) if str(car['driver']).isdigit() else None
-            pass_size = int(car['passanger']) if str(car['passanger']).isdigit() else None
+            driver_size, pass_size = self.db.get_wiper_sizes(car)
             
             # Получение доступных типов корпусов
-            available_frames = self.db.get_available_frames(mount, [driver_size, pass_size])
+            frames = await asyncio.to_thread(self.db.get_available_frame_names, mount, [driver_size, pass_size])
             
-            if available_frames.empty:
+            if not frames:
                 await update.message.reply_text(
                     car_info + "\n⚠️ К сожалению, для этого автомобиля нет подходящих щёток в нашем каталоге.",
-                    parse_mode='HTML'
+                    parse_mode='HTML',
+                    link_preview_options=NO_LINK_PREVIEW
                 )
                 return
             
-            # Создание кнопок для выбора типа корпуса
-            buttons = []
-            for _, rowf in available_frames.iterrows():
-                frame = rowf['gy_frame']
-                frame_id = self.user_manager.store_callback_data({
-                    "brand": car['brand'],
-                    "model": car['model'],
-                    "years": car['years'],
-                    "mount": mount,
-                    "driver_size": driver_size,
-                    "pass_size": pass_size,
-                    "gy_frame": frame
-                })
-                btn = InlineKeyboardButton(str(frame), callback_data=f"frame_{frame_id}")
-                buttons.append([btn])
-            
-
-            
-            # Добавление кнопки для нового поиска
-            buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
-            
+            reply_markup = self.build_frames_markup({
+                "brand": car['brand'],
+                "model": car['model'],
+                "years": car['years'],
+                "mount": mount,
+                "driver_size": driver_size,
+                "pass_size": pass_size,
+            }, frames)
             await update.message.reply_text(
                 car_info + "\n<b>Выберите тип щётки:</b>",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='HTML'
+                reply_markup=reply_markup,
+                parse_mode='HTML',
+                link_preview_options=NO_LINK_PREVIEW
             )
             return
         
-        # Если найдено несколько совпадений
+        # Несколько совпадений или, если точных нет, похожие модели — общий список кнопок
+        if matches.empty:
+            header = f"🔍 По запросу <b>\"{text}\"</b> точных совпадений не найдено, но есть похожие модели:\n\n"
+            matches = similar
+        else:
+            header = f"🔍 По запросу <b>\"{text}\"</b> найдено {len(matches)} моделей:\n\n"
+        
         buttons = self._create_model_buttons(matches)
-        buttons.append([InlineKeyboardButton("🔄 Новый поиск", callback_data="new_search")])
+        buttons.append(NEW_SEARCH_ROW)
         
         await update.message.reply_text(
-            f"🔍 По запросу <b>\"{text}\"</b> найдено {len(matches)} моделей:\n\n"
-            f"Выберите модель из списка:",
+            header + "Выберите модель из списка:",
             reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode='HTML'
+            parse_mode='HTML',
+            link_preview_options=NO_LINK_PREVIEW
+        )
+    
+    def build_frames_markup(self, car_payload: Dict[str, Any], frames: Tuple[str, ...]) -> InlineKeyboardMarkup:
+        """
+        Создает клавиатуру выбора типа корпуса для автомобиля.
+        
+        Args:
+            car_payload: Данные автомобиля для callback (brand, model, years, mount, driver_size, pass_size)
+            frames: Названия доступных корпусов
+            
+        Returns:
+            InlineKeyboardMarkup: Кнопки корпусов и кнопка нового поиска
+        """
+        frame_ids = self.user_manager.store_callback_data_batch(
+            [{**car_payload, "gy_frame": frame} for frame in frames]
         )
+        buttons = [
+            [InlineKeyboardButton(str(frame), callback_data=f"frame_{frame_id}")]
+            for frame, frame_id in zip(frames, frame_ids)
+        ]
+        buttons.append(NEW_SEARCH_ROW)
+        return InlineKeyboardMarkup(buttons)
     
     def _create_model_buttons(self, matches: pd.DataFrame) -> List[List[InlineKeyboardButton]]:
-        matches = matches.sort_values(by=["model", "years"], ascending=[True, True]) 
-        buttons = []
-        seen = set()
-        for _, row in matches.iterrows():
-            key = (row['brand'], row['model'], row['years'])
-            if key not in seen:
-                callback_id = self.user_manager.store_callback_data({
-                    "brand": row['brand'],
-                    "model": row['model'],
-                    "years": row['years'],
-                })
-                callback_data = f"model_{callback_id}"
-                button_text = f"{row['model'].upper()} ({row['years']})"
-                buttons.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-                seen.add(key)
-            if len(buttons) >= Config.MAX_RESULTS:
-                break
-        return buttons
\ No newline at end of file
+        positions = self._build_cursor(matches, Config.MAX_RESULTS)
+        return [[button] for button in self._model_buttons(positions)]
+    
+    def _model_buttons(self, positions: np.ndarray) -> List[InlineKeyboardButton]:
+        """
+        Создает кнопки выбора модели для строк cars_unique_df.
+        
+        Данные модели кодируются прямо в callback_data (car_<поколение каталога>_<позиция>),
+        без callback_storage; по поколению отбрасываются кнопки, созданные для другого каталога.
+        
+        Args:
+            positions: Позиции строк cars_unique_df в порядке отображения
+            
+        Returns:
+            List[InlineKeyboardButton]: Кнопки моделей
+        """
+        # Перевод в списки Python один раз: цикл идет по int/str, а не по скалярам numpy
+        labels = self.db.cars_unique_df['button_label'].to_numpy()[positions].tolist()
+        generation = self.db.cars_generation
+        return [
+            InlineKeyboardButton(label, callback_data=f"car_{generation}_{pos}")
+            for pos, label in zip(positions.tolist(), labels)
+        ]
@@ -6,6 +6,7 @@ import logging
 import asyncio
 from typing import Dict, Any, Optional, List
 
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application, CallbackQueryHandler, CommandHandler,
     ContextTypes, MessageHandler as TelegramMessageHandler, filters
@@ -24,6 +25,11 @@ from handlers.command_handler import CommandHandler as BotCommandHandler
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Пул соединений к Bot API: по умолчанию PTB держит всего несколько соединений,
+# и при одновременных ответах многим пользователям запросы ждут свободного соединения
+CONNECTION_POOL_SIZE = 256
+POOL_TIMEOUT = 10.0
+
 class WipersBot:
     """Основной класс Telegram-бота для подбора щеток."""
     
@@ -37,15 +43,21 @@ class WipersBot:
         # Инициализация компонентов
         self.db = Database()
         self.user_manager = UserManager()
+        self.user_manager.set_cars_df(self.db.cars_df)
         self.synonym_manager = SynonymManager("synonyms.csv", reload_interval=5)
         
         # Инициализация обработчиков
         self.message_handler = MessageHandler(self.db, self.user_manager, self.synonym_manager)
-        self.callback_handler = CallbackHandler(self.db, self.user_manager, self.synonym_manager)
-        self.command_handler = BotCommandHandler(self.user_manager)
+        self.callback_handler = CallbackHandler(self.db, self.user_manager, self.synonym_manager, self.message_handler)
+        self.command_handler = BotCommandHandler(self.user_manager, self.message_handler)
         
         # Инициализация приложения
-        self.application = Application.builder().token(Config.TELEGRAM_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(Config.TELEGRAM_TOKEN)
+            .request(HTTPXRequest(connection_pool_size=CONNECTION_POOL_SIZE, pool_timeout=POOL_TIMEOUT))
+            .build()
+        )
         
         # Регистрация обработчиков
         self._register_handlers()
@@ -86,8 +98,8 @@ class WipersBot:
         if await self.command_handler.handle_feedback(update, context):
             return
         
-        # Обрабатываем сообщение как поисковый запрос
-        await self.message_handler.handle_message(update, context)
+        # Обрабатываем сообщение как поисковый запрос; текст очищается один раз здесь
+        await self.message_handler.handle_message(update, context, update.message.text.strip())
     
     def run(self) -> None:
         """Запускает бота."""
@@ -95,7 +107,7 @@ class WipersBot:
             logger.info("Запуск бота...")
             self.application.run_polling()
         except Exception as e:
-            logger.error(f"Ошибка при запуске бота: {e}")
+            logger.error("Ошибка при запуске бота: %s", e)
     
     def stop(self) -> None:
         """Останавливает бота."""
@@ -104,7 +116,7 @@ class WipersBot:
             self.application.stop()
             self.synonym_manager.stop()
         except Exception as e:
-            logger.error(f"Ошибка при остановке бота: {e}")
+            logger.error("Ошибка при остановке бота: %s", e)
 
 if __name__ == "__main__":
     bot = WipersBot()
@@ -48,9 +48,9 @@ class SynonymManager:
                 with self._lock:
                     self._synonyms = synonyms
                     self._last_mtime = mtime
-                logger.info(f"[SynonymManager] Синонимы перезагружены, {len(synonyms)} записей")
+                logger.info("[SynonymManager] Синонимы перезагружены, %s записей", len(synonyms))
         except Exception as e:
-            logger.error(f"[SynonymManager] Ошибка при перезагрузке синонимов: {e}")
+            logger.error("[SynonymManager] Ошибка при перезагрузке синонимов: %s", e)
 
     def get_synonyms(self) -> Dict[str, str]:
         """
@@ -3,78 +3,97 @@
 """
 import time
 import logging
-from typing import Dict, Any, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Размер кэша по умолчанию, если он не задан в конфигурации
+DEFAULT_CACHE_MAXSIZE = 1024
+
 class SearchCache:
     """Класс для кэширования результатов поиска."""
     
-    def __init__(self, expiry_time: int = Config.CACHE_EXPIRY):
+    def __init__(self, expiry_time: int = Config.CACHE_EXPIRY,
+                 maxsize: int = getattr(Config, 'CACHE_MAXSIZE', DEFAULT_CACHE_MAXSIZE)):
         """
         Инициализация кэша поиска.
         
+        Записи хранятся в порядке последнего обращения (LRU): при переполнении
+        вытесняется самая давно использованная, устаревшие удаляются при обращении.
+        
         Args:
             expiry_time: Время жизни кэша в секундах
+            maxsize: Максимальное количество записей
         """
-        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._cache: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
         self._expiry_time = expiry_time
+        self._maxsize = maxsize
+        # Поиск выполняется в потоках (asyncio.to_thread), поэтому порядок LRU защищен блокировкой
+        self._lock = threading.Lock()
+        # Счетчики вместо логирования каждого обращения
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
     
-    def get(self, query: str) -> Optional[Any]:
+    def get(self, query: Hashable) -> Optional[Any]:
         """
         Получает результат из кэша по запросу.
         
         Args:
-            query: Строка запроса
+            query: Ключ запроса (строка или кортеж)
             
         Returns:
             Optional[Any]: Результат из кэша или None, если результат не найден или устарел
         """
-        if query in self._cache:
-            timestamp, result = self._cache[query]
+        with self._lock:
+            entry = self._cache.get(query)
+            if entry is None:
+                self.misses += 1
+                return None
+            timestamp, result = entry
             if time.time() - timestamp < self._expiry_time:
-                logger.info(f"Найден кэшированный результат для запроса: {query}")
+                self._cache.move_to_end(query)
+                self.hits += 1
                 return result
-            else:
-                # Удаляем устаревший результат
-                del self._cache[query]
-                logger.info(f"Удален устаревший кэшированный результат для запроса: {query}")
-        return None
+            # Удаляем устаревший результат
+            del self._cache[query]
+            self.misses += 1
+            return None
     
-    def set(self, query: str, result: Any) -> None:
+    def set(self, query: Hashable, result: Any) -> None:
         """
         Сохраняет результат в кэш.
         
         Args:
-            query: Строка запроса
+            query: Ключ запроса (строка или кортеж)
             result: Результат для сохранения
         """
-        self._cache[query] = (time.time(), result)
-        logger.info(f"Сохранен результат в кэш для запроса: {query}")
+        with self._lock:
+            self._cache[query] = (time.time(), result)
+            self._cache.move_to_end(query)
+            if len(self._cache) > self._maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
     
     def clear(self) -> None:
         """Очищает весь кэш."""
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
         logger.info("Кэш очищен")
     
-    def clear_expired(self) -> int:
+    def stats(self) -> Dict[str, int]:
         """
-        Очищает устаревшие записи в кэше.
+        Возвращает статистику использования кэша.
         
         Returns:
-            int: Количество удаленных записей
+            Dict[str, int]: Размер кэша, количество попаданий, промахов и вытеснений
         """
-        current_time = time.time()
-        expired_keys = [
-            key for key, (timestamp, _) in self._cache.items()
-            if current_time - timestamp >= self._expiry_time
-        ]
-        
-        for key in expired_keys:
-            del self._cache[key]
-        
-        if expired_keys:
-            logger.info(f"Удалено {len(expired_keys)} устаревших записей из кэша")
-        
-        return len(expired_keys)
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
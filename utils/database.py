@@ -2,21 +2,74 @@
 Модуль для работы с базой данных автомобилей и щеток.
 """
 import os
+import glob
+import hashlib
+import importlib.util
 import logging
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional, Tuple, Any, Set, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 from config import Config
+from utils.text_utils import normalize_text, year_bounds
+from utils.formatting import format_wiper_info, format_wiper_series
 
 logger = logging.getLogger(__name__)
 
+# Колонки базы автомобилей, которые хранятся как категориальные
+CATEGORICAL_CAR_COLUMNS = ('brand', 'brand_lower', 'model', 'model_lower', 'mount')
+# Строковый тип на основе Arrow, если установлен pyarrow; без него колонки остаются object
+STRING_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') is not None else None
+# Строковые колонки с большим числом различных значений
+STRING_CAR_COLUMNS = ('full_name',)
+STRING_WIPER_COLUMNS = ('gy_frame', 'gy_type', 'Комплект')
+# Версия формата снимков Excel; увеличивается при изменении подготовки данных
+SNAPSHOT_VERSION = 3
+# Модули, код которых формирует подготовленные колонки снимка (_prepare_cars_df и его помощники)
+_SNAPSHOT_SOURCES = ('database.py', 'text_utils.py', 'formatting.py')
+
+def _snapshot_tag() -> str:
+    """
+    Вычисляет метку снимков по SNAPSHOT_VERSION и исходному коду подготовки данных.
+    
+    Снимок хранит производные колонки (в том числе готовый текст car_info), поэтому любое
+    изменение кода подготовки должно его инвалидировать, даже если версию забыли увеличить.
+    
+    Returns:
+        str: Метка вида v<версия>-<хэш кода>
+    """
+    digest = hashlib.blake2b(digest_size=4)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in _SNAPSHOT_SOURCES:
+        try:
+            with open(os.path.join(base_dir, name), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(name.encode())
+    return f"v{SNAPSHOT_VERSION}-{digest.hexdigest()}"
+
+SNAPSHOT_TAG = _snapshot_tag()
+
 class Database:
     """Класс для работы с базами данных автомобилей и щеток."""
     
     def __init__(self):
         """Инициализация баз данных."""
         self.cars_df = None
+        self.cars_unique_df = None
+        # Поколение каталога: хэш (brand, model, years) cars_unique_df в порядке строк
+        self.cars_generation: str = ''
         self.wipers_df = None
         self.types_desc_df = None
+        self.brand_index: Dict[str, np.ndarray] = {}
+        self.brand_lower_unique: List[str] = []
+        self.model_index: Dict[str, np.ndarray] = {}
+        # Кэши ниже заполняются лениво, в том числе из потоков asyncio.to_thread. Блокировка не нужна:
+        # отдельные get/присваивание словаря атомарны, а значение для ключа всегда одно и то же,
+        # так что гонка приводит лишь к повторному вычислению и идемпотентной записи
+        self._frames_cache: Dict[Tuple[str, Tuple[Optional[int], ...]], Tuple[str, ...]] = {}
+        self._types_cache: Dict[Tuple[str, str, Tuple[Optional[int], ...]], pd.DataFrame] = {}
+        # (крепление, с обрезкой пробелов) -> булева маска строк wipers_df, где крепление поддерживается ("да")
+        self._mount_masks: Dict[Tuple[str, bool], np.ndarray] = {}
         self.load_all()
     
     def load_all(self) -> bool:
@@ -32,49 +85,265 @@ class Database:
             self.load_types_desc()
             return True
         except Exception as e:
-            logger.error(f"Ошибка при загрузке баз данных: {str(e)}")
+            logger.error("Ошибка при загрузке баз данных: %s", e)
             return False
     
+    @staticmethod
+    def _read_excel_cached(path: str, prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None) -> pd.DataFrame:
+        """
+        Читает первый лист Excel-файла, используя pickle-снимок рядом с ним.
+        
+        Разбор xlsx через openpyxl и последующая нормализация — самая медленная часть запуска,
+        поэтому подготовленный DataFrame сохраняется в <path>.<SNAPSHOT_TAG>.pkl и используется,
+        пока не изменится исходный файл или код подготовки. Снимки других версий удаляются
+        при записи нового.
+        
+        Args:
+            path: Путь к Excel-файлу
+            prepare: Функция подготовки прочитанного листа (результат попадает в снимок)
+            
+        Returns:
+            pd.DataFrame: Содержимое первого листа после подготовки
+        """
+        cache_path = f"{path}.{SNAPSHOT_TAG}.pkl"
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+                return pd.read_pickle(cache_path)
+        except Exception:
+            # Снимка нет или он поврежден — читаем исходный файл
+            pass
+        df = pd.read_excel(path, sheet_name=0, engine='openpyxl')
+        if prepare is not None:
+            df = prepare(df)
+        try:
+            df.to_pickle(cache_path)
+            for stale_path in glob.glob(f"{glob.escape(path)}.v*.pkl"):
+                if stale_path != cache_path:
+                    os.remove(stale_path)
+        except Exception as e:
+            logger.warning("Не удалось сохранить снимок %s: %s", cache_path, e)
+        return df
+    
+    @staticmethod
+    def _to_string_columns(df: pd.DataFrame, columns: Tuple[str, ...]) -> None:
+        """
+        Переводит строковые колонки в STRING_DTYPE (если он доступен).
+        
+        Args:
+            df: DataFrame для изменения на месте
+            columns: Имена колонок (отсутствующие пропускаются)
+        """
+        if STRING_DTYPE is None:
+            return
+        for col in columns:
+            if col in df.columns:
+                df[col] = df[col].astype(str).astype(STRING_DTYPE)
+    
+    def _prepare_cars_df(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Проверяет базу автомобилей и добавляет нормализованные колонки для поиска.
+        
+        Результат сохраняется в снимок. Метка снимка включает хэш кода этого модуля,
+        text_utils и formatting; при переносе помощников подготовки в другие модули их нужно
+        добавить в _SNAPSHOT_SOURCES, а при изменении формата — увеличить SNAPSHOT_VERSION.
+        
+        Args:
+            df: Прочитанный лист базы автомобилей
+            
+        Returns:
+            pd.DataFrame: База с колонками brand_lower, model_lower, full_name, brand_key,
+                размерами щеток и границами годов
+        """
+        df = df.fillna('нет')
+        if not self.validate_database(df):
+            raise ValueError("Ошибка валидации базы данных автомобилей")
+        
+        # Нормализация данных
+        df['brand_lower'] = df['brand'].apply(self.normalize_text)
+        df['model_lower'] = df['model'].apply(self.normalize_text)
+        df['full_name'] = df['brand_lower'] + ' ' + df['model_lower']
+        # Ключ марки без транслитерации (как utils.text_utils.normalize_key), для поиска по марке
+        df['brand_key'] = (
+            df['brand'].astype(str).str.normalize('NFKC').str.casefold().str.strip().astype('category')
+        )
+        # Размеры щеток как nullable int: нечисловые значения ('нет' и т.п.) становятся <NA>
+        df['driver_size'] = pd.to_numeric(df['driver'], errors='coerce').round().astype('Int64')
+        df['pass_size'] = pd.to_numeric(df['passanger'], errors='coerce').round().astype('Int64')
+        # Границы годов выпуска разбираются один раз: фильтр по году становится сравнением чисел
+        bounds = np.array([year_bounds(str(y)) for y in df['years'].to_numpy()], dtype=np.int16).reshape(-1, 2)
+        df['y_start'] = bounds[:, 0]
+        df['y_end'] = bounds[:, 1]
+        # Подписи размеров щеток для карточки автомобиля
+        df['driver_fmt'] = format_wiper_series(df['driver'])
+        df['pass_fmt'] = format_wiper_series(df['passanger'])
+        # Карточка автомобиля целиком: при ответе остается только выбрать готовую строку
+        df['car_info'] = [
+            self._format_car_info(brand, model, years, mount, driver_fmt, pass_fmt)
+            for brand, model, years, mount, driver_fmt, pass_fmt in zip(
+                df['brand'].astype(str).str.title(), df['model'].astype(str).str.upper(),
+                df['years'], df['mount'], df['driver_fmt'], df['pass_fmt']
+            )
+        ]
+        return df
+    
     def load_cars_database(self) -> None:
         """Загружает базу данных автомобилей."""
         try:
-            df = pd.read_excel(Config.DATABASE_PATH, sheet_name=0, engine='openpyxl').fillna('нет')
-            if not self.validate_database(df):
-                raise ValueError("Ошибка валидации базы данных автомобилей")
-            
-            # Нормализация данных
-            df['brand_lower'] = df['brand'].apply(self.normalize_text)
-            df['model_lower'] = df['model'].apply(self.normalize_text)
-            df['full_name'] = df['brand_lower'] + ' ' + df['model_lower']
-            
+            df = self._read_excel_cached(Config.DATABASE_PATH, prepare=self._prepare_cars_df)
             self.cars_df = df
-            logger.info(f"База данных автомобилей загружена успешно: {len(df)} записей")
+            # Выдача поиска строится по уникальным (brand, model, years): дубликаты отбрасываются один раз.
+            # Строки заранее отсортированы по модели и годам, поэтому возрастающие позиции = порядок выдачи
+            # (сравниваются строковые представления: в колонке model из Excel встречаются и числа)
+            self.cars_unique_df = (
+                df.drop_duplicates(subset=['brand', 'model', 'years'])
+                .sort_values(by=['model', 'years'], kind='stable', key=lambda col: col.astype(str))
+                .reset_index(drop=True)
+            )
+            self.cars_generation = self._catalog_generation(self.cars_unique_df)
+            # Подпись кнопки выбора модели, собирается одной векторной операцией
+            self.cars_unique_df['button_label'] = (
+                self.cars_unique_df['model'].astype(str).str.upper()
+                + ' (' + self.cars_unique_df['years'].astype(str) + ')'
+            )
+            # Колонки с малым числом различных значений храним как категории: сравнение со строкой
+            # сводится к сравнению целочисленных кодов. Конвертация после сортировки,
+            # чтобы порядок выдачи не зависел от порядка категорий
+            for frame in (self.cars_df, self.cars_unique_df):
+                for col in CATEGORICAL_CAR_COLUMNS:
+                    frame[col] = frame[col].astype('category')
+                self._to_string_columns(frame, STRING_CAR_COLUMNS)
+            self._build_brand_index()
+            logger.info("База данных автомобилей загружена успешно: %s записей", len(df))
         except Exception as e:
-            logger.error(f"Ошибка при загрузке базы данных автомобилей: {str(e)}")
+            logger.error("Ошибка при загрузке базы данных автомобилей: %s", e)
             raise
     
     def load_wipers_catalog(self) -> None:
         """Загружает каталог щеток."""
         try:
-            wipers = pd.read_excel(Config.WIPERS_PATH, sheet_name=0, engine='openpyxl').fillna('нет')
+            wipers = self._read_excel_cached(Config.WIPERS_PATH).fillna('нет')
             wipers.columns = [col.strip() for col in wipers.columns]
+            self._to_string_columns(wipers, STRING_WIPER_COLUMNS)
+            # Нормализованный размер комплекта ("600/400"); для отсутствующих комплектов — None
+            kit = wipers['Комплект'].astype(str)
+            kit_norm = kit.str.replace(" ", "", regex=False).str.replace("мм", "", regex=False).str.strip()
+            wipers['Комплект_norm'] = kit_norm.where(kit.str.lower() != "нет", None)
             self.wipers_df = wipers
-            logger.info(f"Каталог щеток загружен успешно: {len(wipers)} записей")
+            self._frames_cache.clear()
+            self._types_cache.clear()
+            self._mount_masks.clear()
+            # Маски креплений, встречающихся в базе автомобилей, строятся сразу
+            if self.cars_df is not None:
+                for mount in self.cars_df['mount'].unique():
+                    if mount in wipers.columns:
+                        self._get_mount_mask(mount)
+            logger.info("Каталог щеток загружен успешно: %s записей", len(wipers))
         except Exception as e:
-            logger.error(f"Ошибка при загрузке каталога щеток: {str(e)}")
+            logger.error("Ошибка при загрузке каталога щеток: %s", e)
             raise
     
     def load_types_desc(self) -> None:
         """Загружает описания типов щеток."""
         try:
-            df = pd.read_excel(Config.TYPES_DESC_PATH, sheet_name=0, engine='openpyxl').fillna('')
+            df = self._read_excel_cached(Config.TYPES_DESC_PATH).fillna('')
             df.columns = [col.strip() for col in df.columns]
             self.types_desc_df = df
-            logger.info(f"Описания типов щеток загружены успешно: {len(df)} записей")
+            logger.info("Описания типов щеток загружены успешно: %s записей", len(df))
         except Exception as e:
-            logger.error(f"Ошибка при загрузке описаний типов щеток: {str(e)}")
+            logger.error("Ошибка при загрузке описаний типов щеток: %s", e)
             raise
     
+    def _build_brand_index(self) -> None:
+        """Строит индексы 'ключ марки -> позиции' и 'model_lower -> позиции' строк cars_unique_df."""
+        brand_key = self.cars_unique_df['brand_key']
+        self.brand_index = self.cars_unique_df.groupby(brand_key, observed=True).indices
+        self.brand_lower_unique = list(brand_key.cat.categories)
+        self.model_index = self.cars_unique_df.groupby('model_lower', observed=True).indices
+    
+    def get_cars_by_brand(self, brand_key: str) -> pd.DataFrame:
+        """
+        Возвращает уникальные автомобили с точным совпадением марки.
+        
+        Args:
+            brand_key: Ключ марки (см. utils.text_utils.normalize_key)
+            
+        Returns:
+            pd.DataFrame: Найденные строки (пустой DataFrame, если марка не найдена)
+        """
+        idx = self.brand_index.get(brand_key)
+        if idx is None:
+            return self.cars_unique_df.iloc[0:0]
+        return self.cars_unique_df.iloc[idx]
+    
+    def get_cars_by_model(self, model_lower: str) -> pd.DataFrame:
+        """
+        Возвращает уникальные автомобили с точным совпадением нормализованной модели.
+        
+        Args:
+            model_lower: Модель, нормализованная как колонка model_lower
+            
+        Returns:
+            pd.DataFrame: Найденные строки (пустой DataFrame, если модель не найдена)
+        """
+        idx = self.model_index.get(model_lower)
+        if idx is None:
+            return self.cars_unique_df.iloc[0:0]
+        return self.cars_unique_df.iloc[idx]
+    
+    def get_cars_by_brand_substring(self, brand_part: str) -> pd.DataFrame:
+        """
+        Возвращает уникальные автомобили, марка которых содержит указанную подстроку.
+        
+        Перебираются только уникальные марки, а не все строки базы.
+        
+        Args:
+            brand_part: Часть ключа марки (см. utils.text_utils.normalize_key)
+            
+        Returns:
+            pd.DataFrame: Найденные строки (пустой DataFrame, если совпадений нет)
+        """
+        hits = [b for b in self.brand_lower_unique if brand_part in b]
+        if not hits:
+            return self.cars_unique_df.iloc[0:0]
+        return self.cars_unique_df.iloc[np.concatenate([self.brand_index[b] for b in hits])]
+    
+    @staticmethod
+    def _catalog_generation(unique_df: pd.DataFrame) -> str:
+        """
+        Вычисляет поколение каталога для кнопок, ссылающихся на позиции строк.
+        
+        Хэш зависит только от содержимого и порядка (brand, model, years), поэтому переживает
+        перезапуск с тем же каталогом и меняется, если позиции строк могли сместиться.
+        
+        Args:
+            unique_df: Уникальные автомобили в порядке выдачи
+            
+        Returns:
+            str: Короткий шестнадцатеричный идентификатор
+        """
+        row_hashes = pd.util.hash_pandas_object(
+            unique_df[['brand', 'model', 'years']].astype(str), index=False
+        ).to_numpy()
+        return hashlib.blake2b(row_hashes.tobytes(), digest_size=4).hexdigest()
+    
+    def get_car_key(self, generation: str, position: int) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает марку, модель и годы автомобиля по позиции строки в cars_unique_df.
+        
+        Args:
+            generation: Поколение каталога, для которого была создана кнопка
+            position: Позиция строки
+            
+        Returns:
+            Optional[Dict[str, Any]]: Словарь с ключами brand, model, years или None, если позиция
+            вне диапазона или кнопка создана для другой версии каталога
+        """
+        if (self.cars_unique_df is None or generation != self.cars_generation
+                or not 0 <= position < len(self.cars_unique_df)):
+            return None
+        row = self.cars_unique_df.iloc[position]
+        return {"brand": row['brand'], "model": row['model'], "years": row['years']}
+    
     @staticmethod
     def validate_database(df: pd.DataFrame) -> bool:
         """
@@ -89,7 +358,7 @@ class Database:
         required_columns = ['brand', 'model', 'years', 'mount', 'driver', 'passanger']
         missing_columns = [col for col in required_columns if col not in df.columns]
         if missing_columns:
-            logger.error(f"В базе данных отсутствуют колонки: {missing_columns}")
+            logger.error("В базе данных отсутствуют колонки: %s", missing_columns)
             return False
         return True
     
@@ -104,34 +373,97 @@ class Database:
         Returns:
             str: Нормализованный текст
         """
-        import re
-        from utils.text_utils import translit_ru_to_en
+        return normalize_text(str(s))
+    
+    @staticmethod
+    def get_wiper_sizes(car: Union[pd.Series, Dict[str, Any]]) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Возвращает размеры правой и левой щеток автомобиля.
         
-        s = str(s).strip().lower().replace('ё', 'е')
-        if re.search(r'[а-я]', s):
-            s = translit_ru_to_en(s)
-        return s
+        Args:
+            car: Строка DataFrame (или ее dict) с данными автомобиля
+            
+        Returns:
+            Tuple[Optional[int], Optional[int]]: Размеры в мм или None, если размер не указан
+        """
+        driver_size = car['driver_size']
+        pass_size = car['pass_size']
+        return (
+            None if pd.isna(driver_size) else int(driver_size),
+            None if pd.isna(pass_size) else int(pass_size),
+        )
     
-    def get_car_info(self, row: pd.Series) -> str:
+    def get_car_info(self, row: Union[pd.Series, Dict[str, Any]]) -> str:
         """
         Форматирует информацию об автомобиле для отображения.
         
+        Для строк базы карточка подготовлена при загрузке (колонка car_info),
+        для остальных данных (например, сохраненных в callback_storage) собирается на месте.
+        
         Args:
-            row: Строка DataFrame с данными автомобиля
+            row: Строка DataFrame (или ее dict) с данными автомобиля
             
         Returns:
             str: Отформатированная информация об автомобиле
         """
-        from utils.formatting import format_wiper_info
+        car_info = row.get('car_info')
+        if car_info is not None:
+            return car_info
+        return self._format_car_info(
+            str(row.get('brand', '')).title(),
+            str(row.get('model', '')).upper(),
+            row.get('years', ''),
+            row.get('mount', ''),
+            format_wiper_info(row.get('driver', '')),
+            format_wiper_info(row.get('passanger', '')),
+        )
+    
+    @staticmethod
+    def _format_car_info(brand: str, model: str, years: Any, mount: Any, driver_fmt: str, pass_fmt: str) -> str:
+        """
+        Собирает карточку автомобиля из уже подготовленных значений.
         
+        Args:
+            brand: Марка для отображения
+            model: Модель для отображения
+            years: Годы выпуска
+            mount: Тип крепления
+            driver_fmt: Подпись правой щетки
+            pass_fmt: Подпись левой щетки
+            
+        Returns:
+            str: Отформатированная информация об автомобиле
+        """
         return (
-            f"🚗 <b>{str(row.get('brand', '')).title()} {str(row.get('model', '')).upper()}</b> <i>({row.get('years', '')})</i>\n"
-            f"🔗 <b>Крепление:</b> <i>{row.get('mount', '')}</i>\n"
-            f"➡️ <b>Правая щётка:</b> <code>{format_wiper_info(row.get('driver', ''))}</code>\n"
-            f"⬅️ <b>Левая щётка:</b> <code>{format_wiper_info(row.get('passanger', ''))}</code>\n"
+            f"🚗 <b>{brand} {model}</b> <i>({years})</i>\n"
+            f"🔗 <b>Крепление:</b> <i>{mount}</i>\n"
+            f"➡️ <b>Правая щётка:</b> <code>{driver_fmt}</code>\n"
+            f"⬅️ <b>Левая щётка:</b> <code>{pass_fmt}</code>\n"
             "——————\n"
         )
     
+    def _get_mount_mask(self, mount: str, strip: bool = False) -> np.ndarray:
+        """
+        Возвращает маску строк каталога щеток, поддерживающих крепление.
+        
+        Args:
+            mount: Тип крепления (имя колонки wipers_df)
+            strip: Обрезать пробелы вокруг значения ячейки; подбор корпусов и видов сравнивает
+                значение как есть, а подбор комплектов — без пробелов
+            
+        Returns:
+            np.ndarray: Булева маска строк wipers_df
+        """
+        key = (mount, strip)
+        mask = self._mount_masks.get(key)
+        if mask is None:
+            values = self.wipers_df[mount].astype(str)
+            if strip:
+                values = values.str.strip()
+            mask = (values.str.lower() == "да").to_numpy()
+            self._mount_masks[key] = mask
+        return mask
+    
     def get_available_frames(self, mount: str, sizes: List[int]) -> pd.DataFrame:
         """
         Получает доступные типы корпусов щеток для заданного крепления и размеров.
@@ -148,14 +480,36 @@ class Database:
             return pd.DataFrame()
         
         return self.wipers_df[
-            (self.wipers_df[mount].str.lower() == "да") &
+            self._get_mount_mask(mount) &
             (self.wipers_df['size'].isin(sizes))
         ][['gy_frame', 'gy_frame_pic']].drop_duplicates()
     
+    def get_available_frame_names(self, mount: str, sizes: List[Optional[int]]) -> Tuple[str, ...]:
+        """
+        Возвращает названия доступных корпусов щеток с кэшированием по (крепление, размеры).
+        
+        Args:
+            mount: Тип крепления
+            sizes: Список размеров щеток
+            
+        Returns:
+            Tuple[str, ...]: Названия корпусов (пустой кортеж, если подходящих нет)
+        """
+        key = (mount, tuple(sizes))
+        frames = self._frames_cache.get(key)
+        if frames is None:
+            available_frames = self.get_available_frames(mount, sizes)
+            frames = tuple(available_frames['gy_frame']) if not available_frames.empty else ()
+            self._frames_cache[key] = frames
+        return frames
+    
     def get_available_types(self, frame: str, mount: str, sizes: List[int]) -> pd.DataFrame:
         """
         Получает доступные виды щеток для заданного корпуса, крепления и размеров.
         
+        Каталог неизменен между загрузками, поэтому результат кэшируется по
+        (корпус, крепление, размеры); возвращаемый DataFrame нельзя изменять.
+        
         Args:
             frame: Тип корпуса
             mount: Тип крепления
@@ -168,17 +522,23 @@ class Database:
             logger.error("База данных щеток не загружена")
             return pd.DataFrame()
         
+        key = (frame, mount, tuple(sizes))
+        cached = self._types_cache.get(key)
+        if cached is not None:
+            return cached
+        
         available_types = self.wipers_df[
             (self.wipers_df['gy_frame'] == frame) &
-            (self.wipers_df[mount].str.lower() == "да") &
+            self._get_mount_mask(mount) &
             (self.wipers_df['size'].isin(sizes))
         ][['gy_type', 'gy_type_pic']].drop_duplicates()
         
-        # Сортировка: Premium-щетки в начале списка
-        return available_types.sort_values(
-            by="gy_type",
-            key=lambda col: col.str.lower().str.contains("premium").map(lambda x: 0 if x else 1)
-        )
+        # Premium-щетки в начале списка: устойчивая перестановка по булевому ключу,
+        # остальные строки сохраняют порядок каталога
+        not_premium = ~available_types['gy_type'].astype(str).str.lower().str.contains("premium").to_numpy()
+        available_types = available_types.iloc[np.argsort(not_premium, kind='stable')]
+        self._types_cache[key] = available_types
+        return available_types
     
     def get_wiper_kit_links(self, frame: str, gy_type: str, mount: str, driver_size: int, pass_size: int) -> Tuple[Optional[str], Optional[str]]:
         """
@@ -198,20 +558,19 @@ class Database:
             logger.error("База данных щеток не загружена")
             return None, None
         
-        kits = self.wipers_df[
-            (self.wipers_df['gy_type'].astype(str).str.strip() == str(gy_type).strip()) &
-            (self.wipers_df['gy_frame'].astype(str).str.strip() == str(frame).strip())
-        ].copy()
-        kits = kits[kits[mount].astype(str).str.strip().str.lower() == "да"]
-        kits = kits[kits['Комплект'].notnull() & (kits['Комплект'].astype(str).str.lower() != "нет")]
-        
-        sizes = set()
-        if driver_size and pass_size:
-            sizes.add(f"{driver_size}/{pass_size}")
-            sizes.add(f"{pass_size}/{driver_size}")
+        if not (driver_size and pass_size):
+            return None, None
+        sizes = {f"{driver_size}/{pass_size}", f"{pass_size}/{driver_size}"}
         
-        kits['Комплект_norm'] = kits['Комплект'].apply(lambda s: str(s).replace(" ", "").replace("мм", "").strip())
-        kits = kits[kits['Комплект_norm'].isin(sizes)]
+        # Сначала дешевые маски (крепление, размер комплекта), затем сравнение строк на остатке
+        kits = self.wipers_df[
+            self._get_mount_mask(mount, strip=True) &
+            self.wipers_df['Комплект_norm'].isin(sizes).to_numpy()
+        ]
+        kits = kits[
+            (kits['gy_type'].astype(str).str.strip() == str(gy_type).strip()) &
+            (kits['gy_frame'].astype(str).str.strip() == str(frame).strip())
+        ]
         
         ozon_kit_url, wb_kit_url = None, None
         if not kits.empty:
@@ -221,6 +580,31 @@ class Database:
         
         return ozon_kit_url, wb_kit_url
     
+    @staticmethod
+    def _first_link(rows: pd.DataFrame, columns: Tuple[str, ...]) -> Optional[str]:
+        """
+        Возвращает первое заполненное значение из колонок-ссылок.
+        
+        Строки просматриваются по порядку, внутри строки колонки — в порядке columns.
+        
+        Args:
+            rows: Строки каталога щеток
+            columns: Возможные имена колонки со ссылкой
+            
+        Returns:
+            Optional[str]: Ссылка или None, если ни одна ячейка не заполнена
+        """
+        present = [col for col in columns if col in rows.columns]
+        if not present:
+            return None
+        values = rows[present].to_numpy(dtype=object)
+        filled = pd.notna(values)
+        filled_rows = filled.any(axis=1)
+        if not filled_rows.any():
+            return None
+        row = int(filled_rows.argmax())
+        return values[row, int(filled[row].argmax())]
+    
     def get_single_wiper_links(self, frame: str, gy_type: str, mount: str, size: int) -> Tuple[Optional[str], Optional[str]]:
         '''
         Получает ссылки на одну щетку определенного размера.
@@ -228,45 +612,22 @@ class Database:
         if self.wipers_df is None:
             logger.error("База данных щеток не загружена")
             return None, None
-        wipers = self.wipers_df[
+        candidates = self.wipers_df[
             (self.wipers_df['gy_frame'] == frame) &
-            (self.wipers_df['gy_type'] == gy_type) &
-            (self.wipers_df['size'] == size)
+            (self.wipers_df['gy_type'] == gy_type)
         ]
-        # Если нет точного совпадения по размеру, ищем ближайший размер (в пределах ±10 мм)
+        wipers = candidates[candidates['size'] == size]
+        # Если нет точного совпадения по размеру, ищем ближайший размер (в пределах ±10 мм),
+        # при равном отклонении предпочитая больший размер
         if wipers.empty and isinstance(size, (int, float)):
-            size_int = int(size)
-            for delta in range(1, 11):
-                wipers_plus = self.wipers_df[
-                    (self.wipers_df['gy_frame'] == frame) &
-                    (self.wipers_df['gy_type'] == gy_type) &
-                    (self.wipers_df['size'] == size_int + delta)
-                ]
-                wipers_minus = self.wipers_df[
-                    (self.wipers_df['gy_frame'] == frame) &
-                    (self.wipers_df['gy_type'] == gy_type) &
-                    (self.wipers_df['size'] == size_int - delta)
-                ]
-                if not wipers_plus.empty:
-                    wipers = wipers_plus
-                    break
-                elif not wipers_minus.empty:
-                    wipers = wipers_minus
-                    break
+            delta = pd.to_numeric(candidates['size'], errors='coerce').to_numpy(dtype=float) - int(size)
+            near = (np.abs(delta) >= 1) & (np.abs(delta) <= 10) & (delta == np.round(delta))
+            if near.any():
+                rank = np.where(near, np.abs(delta) * 2 - (delta > 0), np.inf)
+                wipers = candidates[rank == rank.min()]
         if wipers.empty:
             return None, None
-        ozon_url = None
-        wb_url = None
         # Приведение к любому варианту (ozon_url/Оzon) зависит от того, как называются столбцы!
-        for _, wiper in wipers.iterrows():
-            if pd.notna(wiper.get('ozon_url')) and not ozon_url:
-                ozon_url = wiper['ozon_url']
-            if pd.notna(wiper.get('Ozon')) and not ozon_url:
-                ozon_url = wiper['Ozon']
-            if pd.notna(wiper.get('wb_url')) and not wb_url:
-                wb_url = wiper['wb_url']
-            if pd.notna(wiper.get('Wildberries')) and not wb_url:
-                wb_url = wiper['Wildberries']
-            if ozon_url and wb_url:
-                break
+        ozon_url = self._first_link(wipers, ('ozon_url', 'Ozon'))
+        wb_url = self._first_link(wipers, ('wb_url', 'Wildberries'))
         return ozon_url, wb_url
\ No newline at end of file
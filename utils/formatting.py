@@ -3,6 +3,11 @@
 """
 from typing import Any, Optional
 
+import pandas as pd
+
+# Значения размера, означающие отсутствие щетки
+_NO_WIPER_VALUES = ('нет', 'Не указано')
+
 def format_wiper_info(wiper_value: Any) -> str:
     """
     Форматирует информацию о щетке для отображения.
@@ -13,8 +18,20 @@ def format_wiper_info(wiper_value: Any) -> str:
     Returns:
         str: Отформатированная информация о щетке
     """
-    import pandas as pd
-    
-    if pd.isna(wiper_value) or wiper_value in ['нет', 'Не указано']:
+    if pd.isna(wiper_value) or wiper_value in _NO_WIPER_VALUES:
         return 'не установлена'
     return f"{wiper_value} мм"
+
+def format_wiper_series(wiper_values: pd.Series) -> pd.Series:
+    """
+    Форматирует колонку размеров щеток (векторный вариант format_wiper_info).
+    
+    Args:
+        wiper_values: Колонка значений размера щетки
+        
+    Returns:
+        pd.Series: Отформатированная информация о щетках
+    """
+    text = wiper_values.astype(str)
+    missing = wiper_values.isna() | text.isin(_NO_WIPER_VALUES)
+    return (text + ' мм').where(~missing, 'не установлена')
@@ -1,39 +1,74 @@
 """
 Модуль для логирования действий пользователей и системы.
 """
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import time
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
 from config import Config
 
+class _DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке.
+    
+    Стандартный prepare() подставляет аргументы в сообщение до постановки в очередь;
+    здесь запись передается как есть, и форматирование вместе с записью в файл выполняет
+    поток QueueListener. Очередь не покидает процесс, поэтому запись не нужно делать
+    пригодной для pickle, а аргументы логирования (строки, числа, исключения) после вызова
+    логгера не изменяются.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
 # Настройка основного логгера
 def setup_logging() -> None:
     """Настраивает логирование для приложения."""
     # Создаем директорию для логов, если она не существует
     os.makedirs(Config.LOGS_DIR, exist_ok=True)
     
-    # Настройка основного логгера
-    logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.INFO,
-        filename=Config.LOG_FILE
-    )
+    # Все файловые обработчики работают в отдельном потоке (QueueListener): обработчик запроса
+    # только кладет запись в очередь. Очередь обслуживает один QueueHandler на корневом логгере,
+    # поэтому каждая запись ставится в очередь один раз
+    
+    # Основной лог: все записи, включая действия пользователей и ошибки (они дополнительно
+    # пишутся в свои файлы)
+    main_handler = logging.FileHandler(Config.LOG_FILE)
+    main_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
     
-    # Настройка логгера действий пользователей
-    user_logger = logging.getLogger('user_actions')
-    user_logger.setLevel(logging.INFO)
     user_handler = logging.FileHandler(Config.USER_LOG_FILE, encoding='utf-8')
-    user_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-    user_logger.addHandler(user_handler)
+    user_handler.setLevel(logging.INFO)
+    # Время действия пишет сам форматтер, в UTC (раньше дублировалось префиксом "UTC: ..." в сообщении)
+    user_formatter = logging.Formatter('%(asctime)s UTC - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    user_formatter.converter = time.gmtime
+    user_handler.setFormatter(user_formatter)
+    user_handler.addFilter(lambda record: record.name == 'user_actions')
     
-    # Настройка логгера ошибок
-    error_logger = logging.getLogger('errors')
-    error_logger.setLevel(logging.ERROR)
     error_handler = logging.FileHandler(Config.ERROR_LOG_FILE, encoding='utf-8')
+    error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    error_logger.addHandler(error_handler)
+    error_handler.addFilter(lambda record: record.name == 'errors')
+    
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, main_handler, user_handler, error_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # Настройка основного логгера
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(_DeferredFormatQueueHandler(log_queue))
+    
+    # Логгеры действий пользователей и ошибок передают записи корневому (в ту же очередь)
+    logging.getLogger('user_actions').setLevel(logging.INFO)
+    logging.getLogger('errors').setLevel(logging.ERROR)
 
 def get_current_utc() -> str:
     """
@@ -44,6 +79,14 @@ def get_current_utc() -> str:
     """
     return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
+# Шаблоны записи действия пользователя: (есть входной текст, есть результат) -> формат
+_USER_ACTION_FORMATS = {
+    (False, False): "User ID: %s | Username: %s | Action: %s",
+    (True, False): "User ID: %s | Username: %s | Action: %s | Input: %s",
+    (False, True): "User ID: %s | Username: %s | Action: %s | Result: %s",
+    (True, True): "User ID: %s | Username: %s | Action: %s | Input: %s | Result: %s",
+}
+
 def log_user_action(user_id: int, username: str, action: str, input_text: Optional[str] = None, result: Optional[str] = None) -> None:
     """
     Логирует действие пользователя.
@@ -57,16 +100,10 @@ def log_user_action(user_id: int, username: str, action: str, input_text: Option
     """
     user_logger = logging.getLogger('user_actions')
     
-    current_time = get_current_utc()
-    log_message = f"UTC: {current_time} | User ID: {user_id} | Username: {username} | Action: {action}"
-    
-    if input_text:
-        log_message += f" | Input: {input_text}"
-    
-    if result:
-        log_message += f" | Result: {result}"
-    
-    user_logger.info(log_message)
+    # Строка собирается логгером только при выводе записи, без промежуточных конкатенаций
+    fmt = _USER_ACTION_FORMATS[bool(input_text), bool(result)]
+    args = (user_id, username, action) + ((input_text,) if input_text else ()) + ((result,) if result else ())
+    user_logger.info(fmt, *args)
 
 def log_error(error_type: str, error_message: str, context: Optional[Dict[str, Any]] = None) -> None:
     """
@@ -3,15 +3,25 @@
 """
 import re
 import logging
+from bisect import bisect_right
+from collections import defaultdict
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Any, Callable, Set, Tuple
 
-from utils.text_utils import extract_year, year_in_range
+from utils.text_utils import extract_year, normalize_text, remove_year
 from utils.synonyms import apply_synonyms
 from utils.cache import SearchCache
 
 logger = logging.getLogger(__name__)
 
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_SEPARATORS_RE = re.compile(r'[\/,]')
+_MODEL_CODE_RE = re.compile(r"^[ix]?\d+[a-z]*$")
+
+# Словарь индекса, склеенный в одну строку: (слова через "\n", начала слов в строке, позиции строк по словам)
+Vocabulary = Tuple[str, List[int], List[np.ndarray]]
+
 class CarSearchEngine:
     """Класс для поиска автомобилей."""
     
@@ -24,38 +34,154 @@ class CarSearchEngine:
         """
         self.df = df
         self.cache = SearchCache()
+        # Словари инвертированных индексов "слово -> позиции строк" для полного имени и модели
+        self._full_name_vocab = self._build_vocabulary(self._build_token_index(df['full_name']))
+        self._model_vocab = self._build_vocabulary(self._build_token_index(df['model_lower']))
+        # Слова исходной модели без пояснений в скобках, для поиска по номеру модели ВАЗ
+        self._vaz_tokens = self._build_token_index(df['model'].astype(str).map(self._vaz_model_text))
+    
+    @staticmethod
+    def _vaz_model_text(model: str) -> str:
+        """
+        Готовит название модели к разбиению на номера моделей ВАЗ.
+        
+        Args:
+            model: Исходное название модели
+            
+        Returns:
+            str: Название без "[...]", с пробелами вместо "/" и ",", в нижнем регистре
+        """
+        return _SEPARATORS_RE.sub(' ', _BRACKETS_RE.sub('', model)).lower()
+    
+    @staticmethod
+    def _build_token_index(values: pd.Series) -> Dict[str, np.ndarray]:
+        """
+        Строит инвертированный индекс по словам колонки.
+        
+        Args:
+            values: Строковая колонка
+            
+        Returns:
+            Dict[str, np.ndarray]: Слово -> возрастающие позиции строк, в которых оно встречается
+        """
+        index = defaultdict(list)
+        for pos, value in enumerate(values.astype(str).to_numpy()):
+            for token in set(value.split()):
+                index[token].append(pos)
+        return {token: np.asarray(positions, dtype=np.int32) for token, positions in index.items()}
+    
+    @staticmethod
+    def _build_vocabulary(token_index: Dict[str, np.ndarray]) -> Vocabulary:
+        """
+        Склеивает слова индекса в одну строку для поиска подстроки за один проход.
+        
+        Args:
+            token_index: Инвертированный индекс колонки
+            
+        Returns:
+            Vocabulary: Строка слов через "\n", начала слов и позиции строк в том же порядке
+        """
+        tokens = list(token_index)
+        starts = []
+        offset = 0
+        for token in tokens:
+            starts.append(offset)
+            offset += len(token) + 1
+        return '\n'.join(tokens), starts, [token_index[token] for token in tokens]
+    
+    def _rows_containing(self, column: str, vocabulary: Vocabulary, word: str) -> np.ndarray:
+        """
+        Возвращает позиции строк, в которых колонка содержит подстроку word.
+        
+        Подстрока без пробелов целиком лежит внутри одного слова значения, поэтому
+        достаточно найти ее в склеенном словаре индекса (str.find на стороне C), а не
+        просматривать все строки. Для подстрок с пробелами используется обычный поиск по колонке.
+        
+        Args:
+            column: Имя колонки, по которой построен индекс
+            vocabulary: Склеенный словарь индекса колонки
+            word: Искомая подстрока
+            
+        Returns:
+            np.ndarray: Возрастающие позиции строк self.df
+        """
+        if not word or any(ch.isspace() for ch in word):
+            mask = self.df[column].astype(str).str.contains(word, regex=False, na=False).to_numpy()
+            return np.flatnonzero(mask)
+        text, starts, token_positions = vocabulary
+        postings = []
+        find = text.find
+        last = len(starts) - 1
+        pos = find(word)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            postings.append(token_positions[i])
+            # Следующее вхождение ищется с начала следующего слова
+            pos = find(word, starts[i + 1]) if i < last else -1
+        if not postings:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(postings))
     
-    def search(self, query: str, synonyms: Dict[str, str], log_debug: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    def _category_mask(self, column: str, predicate: Callable[[Any], bool]) -> np.ndarray:
+        """
+        Вычисляет предикат по уникальным значениям категориальной колонки.
+        
+        Модели повторяются во многих строках, поэтому предикат вызывается один раз
+        на категорию, а маска строк получается выборкой по кодам.
+        
+        Args:
+            column: Имя категориальной колонки
+            predicate: Функция проверки значения
+            
+        Returns:
+            np.ndarray: Булева маска строк self.df
+        """
+        values = self.df[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            return values.map(predicate).to_numpy(dtype=bool)
+        categories = values.cat.categories
+        hits = np.fromiter((predicate(c) for c in categories), dtype=bool, count=len(categories))
+        codes = values.cat.codes.to_numpy()
+        # Код -1 (пропуск) не совпадает ни с чем
+        return np.append(hits, False)[codes]
+    
+    def search(self, query: str, lookup_synonym: Callable[[str], Optional[str]],
+               log_debug: Optional[Callable[[str], None]] = None, synonyms_generation: int = 0) -> Dict[str, Any]:
         """
         Выполняет поиск автомобилей по запросу.
         
         Args:
             query: Строка запроса
-            synonyms: Словарь синонимов
+            lookup_synonym: Функция 'слово -> каноническое название или None'
             log_debug: Функция для логирования отладочной информации
+            synonyms_generation: Версия словаря синонимов, которым отвечает lookup_synonym
             
         Returns:
             Dict[str, Any]: Результаты поиска
         """
-        # Проверяем кэш
-        cached_result = self.cache.get(query)
+        query_norm = normalize_text(query)
+        
+        # Проверяем кэш: ключ — нормализованный запрос (регистр и крайние пробелы не порождают
+        # отдельные записи) и версия синонимов, чтобы после перезагрузки словаря результаты пересчитывались
+        cache_key = (query_norm, synonyms_generation)
+        cached_result = self.cache.get(cache_key)
         if cached_result is not None:
-            return cached_result
+            return self._restore_result(cached_result)
         
+        # Отладочные записи (шаблон, *аргументы): строки форматируются, только если их логируют
         debug_log = []
         query_orig = query
-        query_norm = self._normalize_text(query)
-        debug_log.append(f"Исходный запрос: {query_orig!r} => normalize: {query_norm!r}")
+        debug_log.append(("Исходный запрос: %r => normalize: %r", query_orig, query_norm))
         
         year = extract_year(query_norm)
         query_wo_year = query_norm
         if year:
-            query_wo_year = re.sub(r'\b' + str(year) + r'\b', '', query_norm).strip()
-        debug_log.append(f"Извлечённый год: {year}. Запрос без года: {query_wo_year!r}")
+            query_wo_year = remove_year(query_norm, year)
+        debug_log.append(("Извлечённый год: %s. Запрос без года: %r", year, query_wo_year))
         
         parts = query_wo_year.split()
-        parts_syn = apply_synonyms(parts, synonyms)
-        debug_log.append(f"Слова после применения синонимов: {parts_syn}")
+        parts_syn = apply_synonyms(parts, lookup_synonym)
+        debug_log.append(("Слова после применения синонимов: %s", parts_syn))
         
         matches = pd.DataFrame()
         fallback_tried = []
@@ -91,14 +217,14 @@ class CarSearchEngine:
         
         # Фильтрация по году
         if not matches.empty and year:
-            filtered_by_year = matches[matches['years'].apply(lambda s: year_in_range(str(s), year))]
-            debug_log.append(f"Финальный фильтр по году {year}: {len(filtered_by_year)} из {len(matches)}")
+            filtered_by_year = matches[(matches['y_start'] <= year) & (matches['y_end'] >= year)]
+            debug_log.append(("Финальный фильтр по году %s: %s из %s", year, len(filtered_by_year), len(matches)))
             matches = filtered_by_year
         
         # Логирование отладочной информации
         if log_debug is not None:
-            for dmsg in debug_log:
-                log_debug(dmsg)
+            for fmt, *args in debug_log:
+                log_debug(fmt % tuple(args))
         
         result = {
             'matches': matches,
@@ -107,29 +233,48 @@ class CarSearchEngine:
             'fallbacks': fallback_tried
         }
         
-        # Сохраняем результат в кэш
-        self.cache.set(query, result)
+        # Сохраняем в кэш позиции строк, а не копии DataFrame
+        self.cache.set(cache_key, {
+            'matches': self._row_positions(matches),
+            'similar': self._row_positions(similar),
+            'log': debug_log,
+            'fallbacks': fallback_tried
+        })
         
         return result
     
-    def _normalize_text(self, s: str) -> str:
+    def _row_positions(self, rows: pd.DataFrame) -> np.ndarray:
         """
-        Нормализует текст для поиска.
+        Возвращает позиции строк результата в self.df.
         
         Args:
-            s: Текст для нормализации
+            rows: Подмножество строк self.df (или пустой DataFrame)
             
         Returns:
-            str: Нормализованный текст
+            np.ndarray: Позиции строк
         """
-        from utils.text_utils import translit_ru_to_en
+        if rows.empty:
+            return np.empty(0, dtype=np.intp)
+        return self.df.index.get_indexer(rows.index)
+    
+    def _restore_result(self, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Восстанавливает результат поиска из закэшированных позиций строк.
         
-        s = str(s).strip().lower().replace('ё', 'е')
-        if re.search(r'[а-я]', s):
-            s = translit_ru_to_en(s)
-        return s
+        Args:
+            cached: Запись кэша с позициями строк
+            
+        Returns:
+            Dict[str, Any]: Результаты поиска в формате search()
+        """
+        return {
+            'matches': self.df.iloc[cached['matches']],
+            'similar': self.df.iloc[cached['similar']],
+            'log': cached['log'],
+            'fallbacks': cached['fallbacks']
+        }
     
-    def _search_vaz_model(self, vaz_model: str, year: Optional[int], debug_log: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame, str]:
+    def _search_vaz_model(self, vaz_model: str, year: Optional[int], debug_log: List[Tuple[Any, ...]]) -> Tuple[pd.DataFrame, pd.DataFrame, str]:
         """
         Поиск по номеру модели ВАЗ.
         
@@ -141,30 +286,24 @@ class CarSearchEngine:
         Returns:
             Tuple[pd.DataFrame, pd.DataFrame, str]: Найденные совпадения, похожие модели и использованный метод
         """
-        debug_log.append(f"ВАЗ поиск по номеру: {vaz_model}")
-        
-        def vaz_match(model_field: str) -> bool:
-            model_field = re.sub(r'\[.*?\]', '', str(model_field))
-            model_field = re.sub(r'[\/,]', ' ', model_field)
-            models = model_field.lower().split()
-            return vaz_model.lower() in models
+        debug_log.append(("ВАЗ поиск по номеру: %s", vaz_model))
         
-        vaz_matches = self.df[self.df['model'].apply(vaz_match)]
-        debug_log.append(f"Найдено строк с ВАЗ {vaz_model}: {len(vaz_matches)}")
+        vaz_matches = self.df.iloc[self._vaz_tokens.get(vaz_model.lower(), np.empty(0, dtype=np.int32))]
+        debug_log.append(("Найдено строк с ВАЗ %s: %s", vaz_model, len(vaz_matches)))
         
         if year:
-            vaz_matches = vaz_matches[vaz_matches['years'].apply(lambda s: year_in_range(str(s), year))]
-            debug_log.append(f"Фильтр по году {year}: осталось {len(vaz_matches)}")
+            vaz_matches = vaz_matches[(vaz_matches['y_start'] <= year) & (vaz_matches['y_end'] >= year)]
+            debug_log.append(("Фильтр по году %s: осталось %s", year, len(vaz_matches)))
         
         similar = pd.DataFrame()
         if vaz_matches.empty:
-            similar = self.df[self.df['model'].apply(lambda m: vaz_model in str(m))]
+            similar = self.df[self._category_mask('model', lambda m: vaz_model in str(m))]
             if not similar.empty:
-                debug_log.append(f"Похожие ВАЗ модели по подстроке '{vaz_model}': {len(similar)}")
+                debug_log.append(("Похожие ВАЗ модели по подстроке '%s': %s", vaz_model, len(similar)))
         
         return vaz_matches, similar, "vaz model+year"
     
-    def _search_brand_model(self, parts_syn: List[str], debug_log: List[str]) -> Tuple[pd.DataFrame, str]:
+    def _search_brand_model(self, parts_syn: List[str], debug_log: List[Tuple[Any, ...]]) -> Tuple[pd.DataFrame, str]:
         """
         Поиск по марке и модели.
         
@@ -176,36 +315,45 @@ class CarSearchEngine:
             Tuple[pd.DataFrame, str]: Найденные совпадения и использованный метод
         """
         brand, model_part = parts_syn
-        matches = pd.DataFrame()
         
-        # Строгое совпадение по бренду и началу модели
-        if model_part.isdigit() or re.match(r"^[ix]?\d+[a-z]*$", model_part):
+        # Строгое совпадение по бренду и началу модели.
+        # model_part — буквенно-цифровой код, поэтому "^model_part\b" уже входит в startswith
+        if model_part.isdigit() or _MODEL_CODE_RE.match(model_part):
             m_strict = self.df[
                 (self.df['brand_lower'] == brand) &
-                (
-                    self.df['model_lower'].str.startswith(model_part) |
-                    self.df['model_lower'].str.match(rf"^{model_part}\b")
-                )
+                self.df['model_lower'].str.startswith(model_part)
             ]
-            debug_log.append(f"Шаг 1a: Строгое совпадение бренд+модель начинается с {model_part}: найдено {len(m_strict)}")
+            debug_log.append(("Шаг 1a: Строгое совпадение бренд+модель начинается с %s: найдено %s", model_part, len(m_strict)))
             if not m_strict.empty:
-                matches = m_strict
-                return matches, "brand+model startswith"
+                return m_strict, "brand+model startswith"
         
         # Поиск по всем словам в полном имени
-        def row_match(row: pd.Series) -> bool:
-            full = row['brand_lower'] + ' ' + row['model_lower']
-            return all(word in full for word in parts_syn)
+        return self._search_multiple_words(parts_syn, debug_log)
+    
+    def _match_all_words(self, words: List[str]) -> pd.DataFrame:
+        """
+        Находит строки, полное имя которых (full_name) содержит все слова.
         
-        m1 = self.df[self.df.apply(row_match, axis=1)]
-        debug_log.append(f"Шаг 1: Совпадение всех слов ({parts_syn}): найдено {len(m1)}")
-        if not m1.empty:
-            matches = m1
-            return matches, "all words in brand+model"
+        Слова проверяются от самого длинного (обычно самого избирательного);
+        позиции строк берутся из инвертированного индекса и пересекаются.
         
-        return matches, ""
+        Args:
+            words: Список слов
+            
+        Returns:
+            pd.DataFrame: Найденные строки self.df
+        """
+        positions = None
+        for word in sorted(set(words), key=len, reverse=True):
+            rows = self._rows_containing('full_name', self._full_name_vocab, word)
+            positions = rows if positions is None else np.intersect1d(positions, rows, assume_unique=True)
+            if len(positions) == 0:
+                break
+        if positions is None:
+            return self.df
+        return self.df.iloc[positions]
     
-    def _search_multiple_words(self, parts_syn: List[str], debug_log: List[str]) -> Tuple[pd.DataFrame, str]:
+    def _search_multiple_words(self, parts_syn: List[str], debug_log: List[Tuple[Any, ...]]) -> Tuple[pd.DataFrame, str]:
         """
         Поиск по нескольким словам.
         
@@ -216,19 +364,15 @@ class CarSearchEngine:
         Returns:
             Tuple[pd.DataFrame, str]: Найденные совпадения и использованный метод
         """
-        def row_match(row: pd.Series) -> bool:
-            full = row['brand_lower'] + ' ' + row['model_lower']
-            return all(word in full for word in parts_syn)
-        
-        m1 = self.df[self.df.apply(row_match, axis=1)]
-        debug_log.append(f"Шаг 1: Совпадение всех слов ({parts_syn}): найдено {len(m1)}")
+        m1 = self._match_all_words(parts_syn)
+        debug_log.append(("Шаг 1: Совпадение всех слов (%s): найдено %s", parts_syn, len(m1)))
         
         if not m1.empty:
             return m1, "all words in brand+model"
         
         return pd.DataFrame(), ""
     
-    def _search_single_word(self, word: str, debug_log: List[str]) -> Tuple[pd.DataFrame, str]:
+    def _search_single_word(self, word: str, debug_log: List[Tuple[Any, ...]]) -> Tuple[pd.DataFrame, str]:
         """
         Поиск по одному слову.
         
@@ -244,31 +388,20 @@ class CarSearchEngine:
         if not m_brand.empty:
             return m_brand, "brand=="
         
-        # Поиск по точному совпадению модели или содержанию в модели
-        m_model = self.df[self.df['model_lower'] == word]
-        m_model_contains = self.df[self.df['model_lower'].str.contains(word, regex=False)]
-        m_model_total = pd.concat([m_model, m_model_contains]).drop_duplicates()
-        if not m_model_total.empty:
-            return m_model_total, "model contains all"
+        # Поиск по содержанию в модели: точное совпадение модели — частный случай,
+        # а совпадение целого слова модели тоже входит в содержание, поэтому достаточно одного поиска
+        m_model_contains = self.df.iloc[self._rows_containing('model_lower', self._model_vocab, word)]
+        if not m_model_contains.empty:
+            return m_model_contains, "model contains all"
         
         # Поиск по нечеткому совпадению бренда
         m_brand_fuzzy = self.df[self.df['brand_lower'].str.contains(word, regex=False)]
         if not m_brand_fuzzy.empty:
             return m_brand_fuzzy, "brand contains (fallback)"
         
-        # Поиск по слову в модели
-        m2 = self.df[self.df['model_lower'].apply(lambda v: word in v.split())]
-        if not m2.empty:
-            return m2, "model word"
-        
-        # Поиск по содержанию в модели (запасной вариант)
-        m_model_contains2 = self.df[self.df['model_lower'].str.contains(word, regex=False)]
-        if not m_model_contains2.empty:
-            return m_model_contains2, "model contains (fallback)"
-        
         return pd.DataFrame(), ""
     
-    def _search_similar_by_year_word(self, word: str, debug_log: List[str]) -> pd.DataFrame:
+    def _search_similar_by_year_word(self, word: str, debug_log: List[Tuple[Any, ...]]) -> pd.DataFrame:
         """
         Поиск похожих моделей по году и слову.
         
@@ -279,11 +412,11 @@ class CarSearchEngine:
         Returns:
             pd.DataFrame: Похожие модели
         """
-        sim = self.df[self.df['model'].apply(
-            lambda m: word in str(m).replace('/', ' ').replace(',', ' ').split()
+        sim = self.df[self._category_mask(
+            'model', lambda m: word in str(m).replace('/', ' ').replace(',', ' ').split()
         )]
         
         if not sim.empty:
-            debug_log.append(f"Похожие модели по слову/номеру '{word}': найдено {len(sim)}")
+            debug_log.append(("Похожие модели по слову/номеру '%s': найдено %s", word, len(sim)))
         
         return sim
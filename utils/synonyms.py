@@ -1,12 +1,13 @@
 """
 Модуль для управления синонимами.
 """
+import csv
 import os
 import threading
-import time
 import logging
-import pandas as pd
-from typing import Dict, Optional
+import types
+from typing import Callable, Dict, Mapping, Optional
+from utils.text_utils import translit_ru_to_en
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +25,15 @@ class SynonymManager:
         self.filepath = filepath
         self.reload_interval = reload_interval
         self._synonyms: Dict[str, str] = {}
+        self._synonyms_view: Mapping[str, str] = types.MappingProxyType(self._synonyms)
         self._last_mtime: Optional[float] = None
+        # Номер версии словаря, увеличивается при каждой перезагрузке (входит в ключи кэшей поиска)
+        self.generation: int = 0
         self._lock = threading.Lock()
-        self._stop = False
+        self._stop_event = threading.Event()
         self.reload_synonyms()
-        threading.Thread(target=self._watch, daemon=True).start()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
 
     def reload_synonyms(self) -> None:
         """Перезагружает синонимы из файла."""
@@ -37,45 +42,89 @@ class SynonymManager:
                 mtime = os.path.getmtime(self.filepath)
                 if self._last_mtime == mtime:
                     return
-                df = pd.read_csv(self.filepath)
                 synonyms = {}
-                for _, row in df.iterrows():
-                    base = str(row['base']).strip().lower()
-                    syns = [s.strip() for s in str(row['synonyms']).strip().lower().split(',') if s.strip()]
-                    for syn in syns:
-                        synonyms[syn] = base
-                    synonyms[base] = base
+                # utf-8-sig: файл может начинаться с BOM
+                with open(self.filepath, encoding='utf-8-sig', newline='') as f:
+                    for row in csv.DictReader(f):
+                        base = (row.get('base') or '').strip().lower()
+                        if not base:
+                            continue
+                        for syn in (row.get('synonyms') or '').lower().split(','):
+                            syn = syn.strip()
+                            if syn:
+                                synonyms[syn] = base
+                        synonyms[base] = base
+                # Транслитерированные ключи: запрос латиницей находится одним обращением к словарю
+                for key, base in list(synonyms.items()):
+                    synonyms.setdefault(translit_ru_to_en(key), base)
                 with self._lock:
                     self._synonyms = synonyms
+                    self._synonyms_view = types.MappingProxyType(synonyms)
                     self._last_mtime = mtime
-                logger.info(f"[SynonymManager] Синонимы перезагружены, {len(synonyms)} записей")
+                    self.generation += 1
+                logger.info("[SynonymManager] Синонимы перезагружены, %s записей", len(synonyms))
         except Exception as e:
-            logger.error(f"[SynonymManager] Ошибка при перезагрузке синонимов: {e}")
+            logger.error("[SynonymManager] Ошибка при перезагрузке синонимов: %s", e)
 
-    def get_synonyms(self) -> Dict[str, str]:
+    def get_synonyms(self) -> Mapping[str, str]:
         """
         Получает словарь синонимов.
         
+        Словарь не копируется: при перезагрузке он заменяется целиком,
+        поэтому возвращается неизменяемое представление текущей версии.
+        
         Returns:
-            Dict[str, str]: Словарь синонимов
+            Mapping[str, str]: Словарь синонимов (только для чтения)
         """
         with self._lock:
-            return dict(self._synonyms)
+            return self._synonyms_view
+
+    def get_canonical(self, word: str) -> Optional[str]:
+        """
+        Возвращает каноническое название для синонима.
+        
+        Args:
+            word: Синоним (в любом регистре)
+            
+        Returns:
+            Optional[str]: Каноническое название или None, если синоним не найден
+        """
+        return self.lookup(word.strip().lower())
+
+    def lookup(self, word: str) -> Optional[str]:
+        """
+        Возвращает каноническое название для уже нормализованного слова.
+        
+        Представление словаря заменяется при перезагрузке одним присваиванием,
+        поэтому чтение не требует блокировки.
+        
+        Args:
+            word: Слово в нижнем регистре
+            
+        Returns:
+            Optional[str]: Каноническое название или None, если синоним не найден
+        """
+        return self._synonyms_view.get(word)
 
     def _watch(self) -> None:
-        """Фоновый поток для отслеживания изменений в файле синонимов."""
-        while not self._stop:
+        """
+        Фоновый поток для отслеживания изменений в файле синонимов.
+        
+        Ждет на событии остановки вместо sleep, поэтому stop() завершает поток сразу.
+        """
+        while not self._stop_event.wait(self.reload_interval):
             self.reload_synonyms()
-            time.sleep(self.reload_interval)
 
     def stop(self) -> None:
         """Останавливает фоновый поток."""
-        self._stop = True
+        self._stop_event.set()
+        self._watcher.join(timeout=1)
 
-def apply_synonyms(parts: list, synonyms: Dict[str, str]) -> list:
+def apply_synonyms(parts: list, lookup: Callable[[str], Optional[str]]) -> list:
     # Сначала ищем по всей строке (соединённые слова)
     joined = " ".join(parts).lower()
-    if joined in synonyms:
-        return [synonyms[joined]]
+    canon = lookup(joined)
+    if canon is not None:
+        return [canon]
     # Потом — по каждому слову отдельно
-    return [synonyms.get(word, word) for word in parts]
+    return [lookup(word) or word for word in parts]
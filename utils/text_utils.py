@@ -2,7 +2,34 @@
 Утилиты для работы с текстом.
 """
 import re
-from typing import Dict, List, Optional, Any, Union
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Tuple, Union
+
+_YEAR_EXTRACT_RE = re.compile(r'\b((19|20)\d\d)\b')
+# Форматы диапазонов годов в порядке приоритета: альтернативы проверяются слева направо,
+# поэтому одного match достаточно вместо последовательных проверок
+_YEAR_RANGE_RE = re.compile(
+    r'\d{2}\.(?P<yy_open>\d{2})-(?:н\.в\.|нв|now)'       # "ГГ.ГГ-н.в."
+    r'|\d{2}\.(?P<yy_start>\d{2})-\d{2}\.(?P<yy_end>\d{2})'  # "ГГ.ГГ-ГГ.ГГ"
+    r'|(?P<yyyy_open>\d{4})-(?:н\.в\.|нв|now)'            # "ГГГГ-н.в."
+    r'|(?P<yyyy_start>\d{4})-(?P<yyyy_end>\d{4})'         # "ГГГГ-ГГГГ"
+    r'|\d{2}\.(?P<yy_from>\d{2})'                       # "ГГ.ГГ-" и "ГГ.ГГ"
+)
+_YEAR_SINGLE_RE = re.compile(r'\d{4}')
+# Конец диапазона для выпуска "по н.в." и диапазон нераспознанной строки
+YEAR_OPEN_END = 9999
+YEAR_EMPTY_RANGE = (1, 0)
+# Размер кэшей функций нормализации: словарь запросов и значений базы невелик
+TEXT_CACHE_SIZE = 8192
+# Таблица транслитерации; str.translate не меняет строки без кириллицы
+_RU_TO_EN_TABLE = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
+})
 
 def translit_ru_to_en(text: str) -> str:
     """
@@ -14,15 +41,34 @@ def translit_ru_to_en(text: str) -> str:
     Returns:
         str: Транслитерированный текст
     """
-    table = str.maketrans({
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
-    })
-    return text.translate(table)
+    return text.translate(_RU_TO_EN_TABLE)
 
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для поиска: нижний регистр, "ё" -> "е", транслитерация кириллицы.
+    
+    Args:
+        text: Текст для нормализации
+        
+    Returns:
+        str: Нормализованный текст
+    """
+    return text.strip().lower().replace('ё', 'е').translate(_RU_TO_EN_TABLE)
+
+def normalize_key(text: str) -> str:
+    """
+    Приводит строку к ключу для точного сравнения без учета регистра.
+    
+    Args:
+        text: Исходная строка
+        
+    Returns:
+        str: Строка после NFKC-нормализации, casefold и удаления крайних пробелов
+    """
+    return unicodedata.normalize('NFKC', text).casefold().strip()
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
 def extract_year(query: str) -> Optional[int]:
     """
     Извлекает год из строки запроса.
@@ -33,77 +79,81 @@ def extract_year(query: str) -> Optional[int]:
     Returns:
         Optional[int]: Извлеченный год или None, если год не найден
     """
-    m = re.search(r'\b((19|20)\d\d)\b', query)
+    m = _YEAR_EXTRACT_RE.search(query)
     if m:
         return int(m.group(1))
     return None
 
-def year_in_range(year_str: str, year: int) -> bool:
+def remove_year(query: str, year: int) -> str:
     """
-    Проверяет, входит ли год в указанный диапазон.
+    Удаляет из запроса все вхождения года как отдельного числа.
+    
+    Используется уже скомпилированный шаблон извлечения года, а не новый шаблон на каждый запрос.
+    
+    Args:
+        query: Строка запроса
+        year: Год, найденный extract_year
+        
+    Returns:
+        str: Запрос без года, без крайних пробелов
+    """
+    year_str = str(year)
+    return _YEAR_EXTRACT_RE.sub(lambda m: '' if m.group(1) == year_str else m.group(0), query).strip()
+
+def year_bounds(year_str: str) -> Tuple[int, int]:
+    """
+    Разбирает строку с диапазоном годов в границы [начало, конец].
+    
+    Выпуск "по н.в." обозначается концом YEAR_OPEN_END, нераспознанная строка —
+    пустым диапазоном (начало больше конца).
     
     Args:
         year_str: Строка с диапазоном годов
-        year: Год для проверки
         
     Returns:
-        bool: True, если год входит в диапазон
+        Tuple[int, int]: Первый и последний год выпуска включительно
     """
     if not isinstance(year_str, str):
-        return False
+        return YEAR_EMPTY_RANGE
     
     year_str = year_str.lower().replace(' ', '').replace('–', '-')
     
-    # Формат "ГГ.ГГ-н.в." (например, "05.10-н.в.")
-    m = re.match(r'(\d{2})\.(\d{2})-(н\.в\.|нв|now)', year_str)
-    if m:
-        start_year = int(m.group(2))
-        start_full = 2000 + start_year if start_year < 100 else start_year
-        return year >= start_full
-    
-    # Формат "ГГ.ГГ-ГГ.ГГ" (например, "05.10-15.20")
-    m = re.match(r'(\d{2})\.(\d{2})-(\d{2})\.(\d{2})', year_str)
-    if m:
-        start_year = int(m.group(2))
-        end_year = int(m.group(4))
-        start_full = 2000 + start_year if start_year < 100 else start_year
-        end_full = 2000 + end_year if end_year < 100 else end_year
-        return start_full <= year <= end_full
-    
-    # Формат "ГГГГ-н.в." (например, "2010-н.в.")
-    m = re.match(r'(\d{4})-(н\.в\.|нв|now)', year_str)
-    if m:
-        start_full = int(m.group(1))
-        return year >= start_full
-    
-    # Формат "ГГГГ-ГГГГ" (например, "2010-2020")
-    m = re.match(r'(\d{4})-(\d{4})', year_str)
-    if m:
-        start_full = int(m.group(1))
-        end_full = int(m.group(2))
-        return start_full <= year <= end_full
-    
-    # Формат "ГГ.ГГ-" (например, "05.10-")
-    m = re.match(r'(\d{2})\.(\d{2})-?', year_str)
+    m = _YEAR_RANGE_RE.match(year_str)
     if m:
-        start_year = int(m.group(2))
-        start_full = 2000 + start_year if start_year < 100 else start_year
-        return year >= start_full
+        groups = m.groupdict()
+        if groups['yy_open'] is not None:
+            return 2000 + int(groups['yy_open']), YEAR_OPEN_END
+        if groups['yy_start'] is not None:
+            return 2000 + int(groups['yy_start']), 2000 + int(groups['yy_end'])
+        if groups['yyyy_open'] is not None:
+            return int(groups['yyyy_open']), YEAR_OPEN_END
+        if groups['yyyy_start'] is not None:
+            return int(groups['yyyy_start']), int(groups['yyyy_end'])
+        # Формат "ГГ.ГГ-" и "ГГ.ГГ": год начала выпуска
+        return 2000 + int(groups['yy_from']), YEAR_OPEN_END
     
-    # Проверка на "н.в." или "now"
+    # Проверка на "н.в." или "now": подходит любой год
     if 'н.в' in year_str or 'now' in year_str:
-        return True
+        return 0, YEAR_OPEN_END
     
     # Формат "ГГГГ" (например, "2010")
-    m = re.match(r'(\d{4})', year_str)
+    m = _YEAR_SINGLE_RE.match(year_str)
     if m:
-        return year == int(m.group(1))
+        y = int(m.group(0))
+        return y, y
     
-    # Формат "ГГ.ГГ" (например, "05.10")
-    m = re.match(r'(\d{2})\.(\d{2})', year_str)
-    if m:
-        y = int(m.group(2))
-        y_full = 2000 + y if y < 100 else y
-        return year == y_full
+    return YEAR_EMPTY_RANGE
+
+def year_in_range(year_str: str, year: int) -> bool:
+    """
+    Проверяет, входит ли год в указанный диапазон.
     
-    return False
+    Args:
+        year_str: Строка с диапазоном годов
+        year: Год для проверки
+        
+    Returns:
+        bool: True, если год входит в диапазон
+    """
+    start, end = year_bounds(year_str)
+    return start <= year <= end
@@ -1,13 +1,44 @@
 """
 Модуль для управления пользовательскими данными.
 """
+import base64
+import functools
 import logging
-import random
-import string
-from typing import Dict, List, Set, Any, Optional
+import os
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.text_utils import normalize_key
+
+try:
+    # Сжатое битовое множество для ID пользователей (ID Telegram не помещаются в 32 бита)
+    from pyroaring import BitMap64 as _UserIdSet
+except ImportError:
+    _UserIdSet = set
 
 logger = logging.getLogger(__name__)
 
+_b32encode = base64.b32encode
+_pack = pickle.dumps
+_unpack = pickle.loads
+_monotonic = time.monotonic
+
+# Максимальное количество сохраненных данных callback; при переполнении удаляются самые давние
+CALLBACK_STORAGE_MAXSIZE = 10_000
+# Время жизни данных callback с момента последнего использования, в секундах
+CALLBACK_TTL = 3600
+# Количество марок, для которых хранится отсортированный список моделей
+SORTED_MODELS_CACHE_SIZE = 256
+
+class UserStats(NamedTuple):
+    """Статистика пользователей."""
+    unique_users: int
+    all_users_count: int
+
 def random_id(length: int = 6) -> str:
     """
     Генерирует случайный идентификатор.
@@ -18,25 +49,127 @@ def random_id(length: int = 6) -> str:
     Returns:
         str: Случайный идентификатор
     """
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+    # Один системный вызов и кодирование в base32 (A-Z, 2-7) на стороне C
+    return _b32encode(os.urandom((length * 5 + 7) // 8)).decode('ascii')[:length]
 
 class UserManager:
     """Класс для управления пользовательскими данными."""
     
-    def __init__(self):
-        """Инициализация менеджера пользователей."""
-        self.unique_users: Set[int] = set()
+    __slots__ = (
+        'unique_users', 'all_users_count', 'callback_storage', 'callback_storage_maxsize', 'callback_ttl',
+        '_last_callback', '_payload_shapes', '_payload_shape_ids', '_payload_ids',
+        'favorites', 'cars_df', '_models_by_brand', '_sorted_models_cache',
+    )
+    
+    def __init__(self, callback_storage_maxsize: int = CALLBACK_STORAGE_MAXSIZE,
+                 callback_ttl: float = CALLBACK_TTL):
+        """
+        Инициализация менеджера пользователей.
+        
+        Args:
+            callback_storage_maxsize: Максимальное количество сохраненных данных callback
+            callback_ttl: Время жизни данных callback с момента последнего использования, в секундах
+        """
+        # BitMap64 из pyroaring, если установлен (в разы компактнее set), иначе обычный set
+        self.unique_users: Set[int] = _UserIdSet()
         self.all_users_count: int = 0
-        self.callback_storage: Dict[str, Dict[str, Any]] = {}
+        # Упакованные данные callback в порядке последнего использования (LRU):
+        # (время последнего использования, bytes) вместо словаря
+        self.callback_storage: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.callback_storage_maxsize = callback_storage_maxsize
+        self.callback_ttl = callback_ttl
+        # Последние запрошенные данные callback в распакованном виде: одну и ту же кнопку
+        # часто нажимают повторно (например, "Назад"); наружу отдается только копия
+        self._last_callback: Tuple[Optional[str], Optional[Dict[str, Any]]] = (None, None)
+        # Наборы ключей данных callback: упакованная запись хранит только номер набора и значения
+        self._payload_shapes: List[Tuple[str, ...]] = []
+        self._payload_shape_ids: Dict[Tuple[str, ...], int] = {}
+        # Упакованные данные -> идентификатор: одинаковые данные хранятся один раз
+        self._payload_ids: Dict[bytes, str] = {}
         self.favorites: Dict[int, List[Dict[str, Any]]] = {}
+        self.cars_df = None
+        # Ключ марки (normalize_key) -> отсортированные модели марки
+        self._models_by_brand: Dict[str, Tuple[Any, ...]] = {}
+        # Ключ марки -> отсортированные модели; ограниченный LRU-кэш на экземпляр
+        self._sorted_models_cache = functools.lru_cache(maxsize=SORTED_MODELS_CACHE_SIZE)(self._sort_models)
+    
+    def set_cars_df(self, cars_df) -> None:
+        """
+        Устанавливает DataFrame автомобилей и строит таблицу моделей по маркам.
+        
+        Args:
+            cars_df: DataFrame с колонками 'brand_key' и 'model'
+        """
+        self.cars_df = cars_df
+        self._models_by_brand = {
+            brand_key: self._unique_sorted(models.to_numpy())
+            for brand_key, models in cars_df.groupby('brand_key', observed=True)['model']
+        }
+        self._sorted_models_cache.cache_clear()
+    
+    @staticmethod
+    def _unique_sorted(values: np.ndarray) -> Tuple[Any, ...]:
+        """
+        Возвращает уникальные значения, отсортированные по строковому представлению.
+        
+        В колонке model из Excel встречаются и числа, и строки, которые нельзя сравнивать
+        между собой, поэтому np.unique сортирует строки, а значения берутся исходные.
+        
+        Args:
+            values: Значения колонки
+            
+        Returns:
+            Tuple[Any, ...]: Уникальные исходные значения
+        """
+        _, first = np.unique(values.astype(str), return_index=True)
+        return tuple(values[first].tolist())
+    
+    def is_valid_brand(self, brand: str) -> bool:
+        """
+        Проверяет, есть ли марка в базе автомобилей.
+        
+        Args:
+            brand: Марка (в любом регистре)
+            
+        Returns:
+            bool: True, если марка есть в базе
+        """
+        return normalize_key(brand) in self._models_by_brand
     
     def get_models_for_brand(self, brand: str) -> list:
         """
         Возвращает список моделей для указанной марки.
         """
-        # Пример через pandas (или подстрой под свою базу)
-        # self.cars_df — DataFrame с колонкой 'brand' и 'model'
-        return sorted(self.cars_df[self.cars_df['brand'].str.lower() == brand.lower()]['model'].unique())
+        # Таблица строится один раз в set_cars_df
+        return list(self._models_by_brand.get(normalize_key(brand), ()))
+    
+    def get_sorted_models(self, brand: str) -> Tuple[str, ...]:
+        """
+        Возвращает отсортированный список моделей марки, кэшируя результат.
+        
+        Args:
+            brand: Марка автомобиля
+            
+        Returns:
+            Tuple[str, ...]: Модели, приведенные к строке и отсортированные без учета регистра
+        """
+        # Ключ кэша — нормализованная марка, чтобы "BMW", "bmw" и "bmw " не хранились отдельно
+        return self._sorted_models_cache(normalize_key(brand))
+    
+    def _sort_models(self, brand_key: str) -> Tuple[str, ...]:
+        """
+        Сортирует модели марки (вызывается через _sorted_models_cache).
+        
+        Args:
+            brand_key: Ключ марки (normalize_key)
+            
+        Returns:
+            Tuple[str, ...]: Модели, приведенные к строке и отсортированные без учета регистра
+        """
+        return tuple(sorted(
+            (str(m).strip() for m in self._models_by_brand.get(brand_key, ())),
+            key=str.upper
+        ))
     
     def register_user(self, user_id: int) -> None:
         """
@@ -45,6 +178,8 @@ class UserManager:
         Args:
             user_id: ID пользователя
         """
+        # all_users_count — счетчик обращений (в /stats: "Всего обращений"), а не пользователей,
+        # поэтому он растет при каждом вызове; add для уже известного ID ничего не меняет
         self.unique_users.add(user_id)
         self.all_users_count += 1
     
@@ -58,10 +193,100 @@ class UserManager:
         Returns:
             str: Идентификатор сохраненных данных
         """
+        callback_id = self._put_callback_data(self._pack_payload(data), _monotonic())
+        self._evict_callback_data()
+        return callback_id
+    
+    def store_callback_data_batch(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """
+        Сохраняет пачку данных для callback за один вызов.
+        
+        Args:
+            payloads: Список данных для сохранения
+            
+        Returns:
+            List[str]: Идентификаторы в том же порядке, что и payloads
+        """
+        now = _monotonic()
+        # Идентификатор записывается сразу, чтобы он не повторился и внутри пачки
+        callback_ids = [self._put_callback_data(self._pack_payload(payload), now) for payload in payloads]
+        self._evict_callback_data()
+        return callback_ids
+    
+    def _put_callback_data(self, raw: bytes, now: float) -> str:
+        """
+        Записывает упакованные данные callback, повторно используя идентификатор тех же данных.
+        
+        Args:
+            raw: Упакованные данные
+            now: Время использования (time.monotonic)
+            
+        Returns:
+            str: Идентификатор данных
+        """
+        storage = self.callback_storage
+        callback_id = self._payload_ids.get(raw)
+        if callback_id is not None:
+            # Те же данные уже сохранены (например, то же меню у другого пользователя)
+            storage.move_to_end(callback_id)
+        else:
+            callback_id = self._payload_ids[raw] = self._new_callback_id()
+        storage[callback_id] = (now, raw)
+        return callback_id
+    
+    def _drop_callback_data(self, callback_id: str, raw: bytes) -> None:
+        """
+        Забывает удаленные из callback_storage данные во вспомогательных структурах.
+        
+        Args:
+            callback_id: Идентификатор данных
+            raw: Упакованные данные
+        """
+        del self._payload_ids[raw]
+        if callback_id == self._last_callback[0]:
+            self._last_callback = (None, None)
+    
+    def _pack_payload(self, data: Dict[str, Any]) -> bytes:
+        """
+        Упаковывает данные callback в bytes без повторения имен ключей.
+        
+        Args:
+            data: Данные для упаковки
+            
+        Returns:
+            bytes: Номер набора ключей и значения в сериализованном виде
+        """
+        keys = tuple(data)
+        shape_id = self._payload_shape_ids.get(keys)
+        if shape_id is None:
+            # Наборов ключей немного (марка/модель, автомобиль, корпус, вид щетки)
+            shape_id = self._payload_shape_ids[keys] = len(self._payload_shapes)
+            self._payload_shapes.append(keys)
+        return _pack((shape_id, tuple(data.values())), pickle.HIGHEST_PROTOCOL)
+    
+    def _new_callback_id(self) -> str:
+        """
+        Генерирует идентификатор callback, еще не занятый в callback_storage.
+        
+        Returns:
+            str: Свободный идентификатор
+        """
+        contains = self.callback_storage.__contains__
         callback_id = random_id()
-        self.callback_storage[callback_id] = data
+        while contains(callback_id):
+            callback_id = random_id()
         return callback_id
     
+    def _evict_callback_data(self) -> None:
+        """Удаляет устаревшие данные callback и самые давно использованные сверх лимита."""
+        storage = self.callback_storage
+        # Записи упорядочены по времени использования, поэтому устаревшие всегда в начале
+        deadline = _monotonic() - self.callback_ttl
+        while storage and (len(storage) > self.callback_storage_maxsize
+                           or next(iter(storage.values()))[0] < deadline):
+            callback_id, (_, raw) = storage.popitem(last=False)
+            self._drop_callback_data(callback_id, raw)
+    
     def get_callback_data(self, callback_id: str) -> Optional[Dict[str, Any]]:
         """
         Получает данные по идентификатору callback.
@@ -72,18 +297,34 @@ class UserManager:
         Returns:
             Optional[Dict[str, Any]]: Данные callback или None, если не найдены
         """
-        return self.callback_storage.get(callback_id)
+        storage = self.callback_storage
+        entry = storage.get(callback_id)
+        if entry is None:
+            return None
+        now = _monotonic()
+        last_used, raw = entry
+        if now - last_used >= self.callback_ttl:
+            del storage[callback_id]
+            self._drop_callback_data(callback_id, raw)
+            return None
+        storage[callback_id] = (now, raw)
+        storage.move_to_end(callback_id)
+        last_id, last_data = self._last_callback
+        if callback_id == last_id:
+            # Данные уже распакованы; копия, чтобы вызывающий код не менял закэшированный словарь
+            return dict(last_data)
+        shape_id, values = _unpack(raw)
+        data = dict(zip(self._payload_shapes[shape_id], values))
+        self._last_callback = (callback_id, data)
+        return dict(data)
     
 
     
-    def get_stats(self) -> Dict[str, int]:
+    def get_stats(self) -> UserStats:
         """
         Получает статистику пользователей.
         
         Returns:
-            Dict[str, int]: Статистика пользователей
+            UserStats: Статистика пользователей
         """
-        return {
-            'unique_users': len(self.unique_users),
-            'all_users_count': self.all_users_count
-        }
+        return UserStats(len(self.unique_users), self.all_users_count)